@@ -0,0 +1,218 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from urllib.parse import urlencode
+
+from app.config import Settings
+from app.metrics import REGISTRY
+from app.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+CACHE_PREFIX = "cars:"
+LIST_PREFIX = f"{CACHE_PREFIX}list:"
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    headers: dict = field(default_factory=dict)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    sets: int = 0
+    invalidations: int = 0
+
+
+class NullCacheBackend:
+    async def get(self, key: str) -> CachedResponse | None:
+        return None
+
+    async def set(self, key: str, value: CachedResponse, ttl: int):
+        pass
+
+    async def delete(self, *keys: str):
+        pass
+
+    async def delete_prefix(self, prefix: str):
+        pass
+
+
+class InMemoryCacheBackend:
+    """Per-process LRU cache with a TTL per entry"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, CachedResponse]] = OrderedDict()
+
+    async def get(self, key: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: CachedResponse, ttl: int):
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def delete_prefix(self, prefix: str):
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            del self._entries[key]
+
+
+class RedisCacheBackend:
+    """Cache shared between processes, stored in Redis as JSON envelopes"""
+
+    def __init__(self, url: str | None = None, client=None):
+        if client is None:
+            from redis.asyncio import Redis
+
+            client = Redis.from_url(url)
+        self.client = client
+
+    async def get(self, key: str) -> CachedResponse | None:
+        value = await self.client.get(key)
+        if value is None:
+            return None
+        envelope = json.loads(value)
+        return CachedResponse(body=envelope["body"].encode(), headers=envelope["headers"])
+
+    async def set(self, key: str, value: CachedResponse, ttl: int):
+        envelope = {"body": value.body.decode(), "headers": value.headers}
+        await self.client.set(key, json.dumps(envelope), ex=ttl)
+
+    async def delete(self, *keys: str):
+        if keys:
+            await self.client.delete(*keys)
+
+    async def delete_prefix(self, prefix: str):
+        keys = [key async for key in self.client.scan_iter(match=f"{prefix}*")]
+        await self.delete(*keys)
+
+
+class ResponseCache:
+    def __init__(self, backend, ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = CacheStats()
+        # Cache misses of identical requests share one database call
+        self.flights = SingleFlight()
+        # Listings dropped once for every invalidation arriving while a drop is pending
+        self._listings_stale = False
+        self._listings_drop: asyncio.Task | None = None
+
+    @staticmethod
+    def car_key(car_id) -> str:
+        return f"{CACHE_PREFIX}car:{car_id}"
+
+    @staticmethod
+    def list_key(**params) -> str:
+        normalized = sorted((name, value) for name, value in params.items() if value is not None)
+        return f"{LIST_PREFIX}{urlencode(normalized)}"
+
+    @classmethod
+    def facets_key(cls, **params) -> str:
+        # Kept under the listings prefix so writes invalidate facets too
+        return cls.list_key(**params).replace(":list:", ":list:facets:", 1)
+
+    @classmethod
+    def count_key(cls, **params) -> str:
+        # Kept under the listings prefix so writes invalidate totals too
+        return cls.list_key(**params).replace(":list:", ":list:count:", 1)
+
+    async def get(self, key: str) -> CachedResponse | None:
+        value = await self.backend.get(key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    async def set(self, key: str, value: CachedResponse, ttl: int | None = None):
+        self.stats.sets += 1
+        await self.backend.set(key, value, ttl or self.ttl)
+
+    async def invalidate_cars(self, *car_ids, wait_for_listings: bool = True):
+        """Drop the cached details of the given cars and every cached listing
+
+        Calls in flight for them are forgotten too, requests arriving after a write do not get
+        what was read before it. Dropping the listings scans the whole prefix, invalidations
+        arriving meanwhile share the next scan; without wait_for_listings, e.g. for each event of
+        a change feed burst, it runs in the background.
+        """
+        self.stats.invalidations += 1
+        car_keys = [self.car_key(car_id) for car_id in car_ids]
+        self.flights.forget(*car_keys, prefix=LIST_PREFIX)
+        await self.backend.delete(*car_keys)
+        self._listings_stale = True
+        if self._listings_drop is None or self._listings_drop.done():
+            self._listings_drop = asyncio.ensure_future(self._drop_listings())
+            self._listings_drop.add_done_callback(_log_failed_drop)
+        if wait_for_listings:
+            await asyncio.shield(self._listings_drop)
+
+    async def _drop_listings(self):
+        while self._listings_stale:
+            # invalidations of the same tick join this drop
+            await asyncio.sleep(0)
+            self._listings_stale = False
+            await self.backend.delete_prefix(LIST_PREFIX)
+
+    async def clear(self):
+        await self.backend.delete_prefix(CACHE_PREFIX)
+        self.stats = CacheStats()
+
+    def stats_dict(self) -> dict:
+        return asdict(self.stats)
+
+
+def _log_failed_drop(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("Could not drop the cached listings: %s", task.exception())
+
+
+_cache: ResponseCache | None = None
+
+
+def get_cache() -> ResponseCache:
+    global _cache
+    if _cache is None:
+        if Settings.CACHE_BACKEND == "redis":
+            backend = RedisCacheBackend(Settings.REDIS_URL)
+        elif Settings.CACHE_BACKEND == "memory":
+            backend = InMemoryCacheBackend(Settings.CACHE_MAX_ENTRIES)
+        else:
+            backend = NullCacheBackend()
+        _cache = ResponseCache(backend, Settings.CACHE_TTL)
+    return _cache
+
+
+@REGISTRY.register_collector
+def cache_metrics() -> list[str]:
+    lines = []
+    for name, value in get_cache().stats_dict().items():
+        metric = f"response_cache_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    return lines
+
+
+# Response cache dependency
+async def response_cache() -> ResponseCache:
+    return get_cache()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.cache import CachedResponse, ResponseCache
+from app.conditional import VERSION_PROJECTION, car_headers
+from app.config import Settings
+from app.models import CarModelFull, model_projection
+from app.serialization import compile_row_converter, dumps
+
+logger = logging.getLogger(__name__)
+
+# Change streams need a replica set or a sharded cluster
+CHANGE_STREAMS_NOT_SUPPORTED = 40573
+WATCHED_OPERATIONS = ["insert", "update", "replace", "delete"]
+WATCH_PIPELINE = [{"$match": {"operationType": {"$in": WATCHED_OPERATIONS}}}]
+
+_car_details = compile_row_converter(CarModelFull)
+DETAILS_PROJECTION = {**model_projection(CarModelFull), **VERSION_PROJECTION}
+
+
+def render_car_details(car: dict) -> CachedResponse:
+    return CachedResponse(
+        body=dumps(_car_details(car)), headers=car_headers(car, Settings.CACHE_CONTROL_DETAILS)
+    )
+
+
+async def cache_car_details(cache: ResponseCache, car: dict) -> CachedResponse:
+    """Render a car details response body and keep it in the response cache"""
+    details = render_car_details(car)
+    await cache.set(cache.car_key(car["_id"]), details)
+    return details
+
+
+class CarFeed:
+    """Fan out car changes to every connected /cars/stream client"""
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers: set[asyncio.Queue] = set()
+
+    @contextmanager
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self.subscribers.discard(queue)
+
+    def publish(self, event: str, data: bytes):
+        for queue in self.subscribers:
+            if queue.full():
+                # A slow client loses its oldest events rather than holding back the others
+                queue.get_nowait()
+            queue.put_nowait((event, data))
+
+
+FEED = CarFeed(Settings.CHANGE_FEED_QUEUE_SIZE)
+
+
+async def car_events(feed: CarFeed, heartbeat: float) -> AsyncIterator[str]:
+    """Server-sent events, with a comment line as keep-alive while the feed is quiet"""
+    with feed.subscribe() as queue:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: {event}\ndata: {data.decode()}\n\n"
+
+
+async def apply_change(cache: ResponseCache, feed: CarFeed, operation: str, car_id, car=None):
+    """Invalidate the cache for a changed car, warm its details and notify the feed
+
+    The listings are dropped in the background, once for a burst of changes.
+    """
+    await cache.invalidate_cars(car_id, wait_for_listings=False)
+    if car is None:
+        feed.publish(operation, dumps({"_id": str(car_id)}))
+        return
+
+    details = await cache_car_details(cache, car)
+    feed.publish(operation, details.body)
+
+
+async def change_streams_supported(collection: AsyncIOMotorCollection) -> bool:
+    """Open and close a change stream once, the deployment tells right away if it has none"""
+    while True:
+        try:
+            async with collection.watch(WATCH_PIPELINE):
+                return True
+        except (TypeError, NotImplementedError):
+            # local stand-ins such as mongomock have no change streams at all
+            return False
+        except OperationFailure as error:
+            if error.code == CHANGE_STREAMS_NOT_SUPPORTED:
+                return False
+            logger.warning("Could not open the cars change stream, retrying: %s", error)
+        except PyMongoError as error:
+            logger.warning("Could not open the cars change stream, retrying: %s", error)
+        await asyncio.sleep(Settings.CHANGE_FEED_POLL_INTERVAL)
+
+
+async def watch_changes(collection: AsyncIOMotorCollection, cache: ResponseCache, feed: CarFeed):
+    if not await change_streams_supported(collection):
+        return await poll_changes(collection, cache, feed)
+
+    resume_token = None
+    while True:
+        try:
+            async with collection.watch(
+                WATCH_PIPELINE, full_document="updateLookup", resume_after=resume_token
+            ) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    operation = change["operationType"]
+                    car = change.get("fullDocument")
+                    if car is not None:
+                        car = {field: car[field] for field in DETAILS_PROJECTION if field in car}
+                    await apply_change(cache, feed, operation, change["documentKey"]["_id"], car)
+        except PyMongoError as error:
+            logger.warning("Cars change stream interrupted, resuming: %s", error)
+            await asyncio.sleep(Settings.CHANGE_FEED_POLL_INTERVAL)
+        except Exception:
+            logger.exception("Cars change feed stopped")
+            raise
+
+
+async def poll_changes(collection: AsyncIOMotorCollection, cache: ResponseCache, feed: CarFeed):
+    """Fallback on updated_at, it sees inserts and updates made through versioned writes only"""
+    logger.info("Change streams are not available, polling the cars collection instead")
+    since = datetime.now(timezone.utc)
+    # Versions of the cars applied at the since millisecond: it is polled again, a car written
+    # in that millisecond after the last poll still shows up
+    applied = {}
+    while True:
+        await asyncio.sleep(Settings.CHANGE_FEED_POLL_INTERVAL)
+        try:
+            cars = collection.find({"updated_at": {"$gte": since}}, DETAILS_PROJECTION).sort(
+                "updated_at", 1
+            )
+            async for car in cars:
+                if applied.get(car["_id"], 0) == car.get("version"):
+                    continue
+                if car["updated_at"] != since:
+                    since, applied = car["updated_at"], {}
+                applied[car["_id"]] = car.get("version")
+                operation = "insert" if car.get("version") == 1 else "update"
+                await apply_change(cache, feed, operation, car["_id"], car)
+        except PyMongoError as error:
+            logger.warning("Could not poll the cars collection: %s", error)
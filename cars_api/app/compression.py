@@ -0,0 +1,174 @@
+import importlib.util
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript")
+# Each event has to reach the client as soon as it is sent
+UNCOMPRESSED_TYPES = ("text/event-stream",)
+
+
+class GzipEncoder:
+    def __init__(self):
+        self._compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder:
+    def __init__(self):
+        import brotli
+
+        # quality 4 compresses close to gzip -9 at a speed suited to dynamic responses
+        self._compressor = brotli.Compressor(quality=4)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class ZstdEncoder:
+    def __init__(self):
+        import zstandard
+
+        self._flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+        self._compressor = zstandard.ZstdCompressor(level=3).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.flush(self._flush_block)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+def available_encoders() -> dict:
+    """Optional codecs are offered when installed, and only imported by their first response"""
+    encoders = {"gzip": GzipEncoder}
+    if importlib.util.find_spec("brotli"):
+        encoders["br"] = BrotliEncoder
+    if importlib.util.find_spec("zstandard"):
+        encoders["zstd"] = ZstdEncoder
+    return encoders
+
+
+def negotiate(accept_encoding: str, preferred: list[str]) -> str | None:
+    """First of the server's preferred encodings the client accepts, honouring q=0"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0
+        accepted[coding.strip().lower()] = quality
+    for coding in preferred:
+        if accepted.get(coding, accepted.get("*", 0)) > 0:
+            return coding
+    return None
+
+
+def compressible(headers: Headers) -> bool:
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").split(";")[0].strip()
+    if content_type in UNCOMPRESSED_TYPES:
+        return False
+    return content_type.startswith("text/") or content_type in COMPRESSIBLE_TYPES
+
+
+class CompressionMiddleware:
+    """Compress responses with the negotiated encoding
+
+    Single body responses under minimum_size are sent as they are, streamed bodies are compressed
+    and flushed chunk by chunk so clients keep receiving rows as they are exported.
+    """
+
+    def __init__(self, app, minimum_size: int, encodings: list[str]):
+        self.app = app
+        self.minimum_size = minimum_size
+        encoders = available_encoders()
+        self.encoders = {coding: encoders[coding] for coding in encodings if coding in encoders}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        coding = negotiate(Headers(scope=scope).get("accept-encoding", ""), list(self.encoders))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, encoder, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not compressible(headers):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = self.encoders[coding]()
+                headers["Content-Encoding"] = coding
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/"):
+                    # the compressed bytes differ from the ones the strong ETag was computed on
+                    headers["ETag"] = f"W/{etag}"
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                if not more_body:
+                    body = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start_message)
+
+            if more_body:
+                body = encoder.compress(body) + encoder.flush()
+            else:
+                body = encoder.compress(body) + encoder.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
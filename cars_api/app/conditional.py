@@ -0,0 +1,49 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+from fastapi import Response, status
+
+# Fields maintained on every write so reads can answer conditional requests cheaply
+VERSION_PROJECTION = {"version": 1, "updated_at": 1}
+
+
+def versioned_insert(document: dict) -> dict:
+    return {**document, "version": 1, "updated_at": datetime.now(timezone.utc)}
+
+
+def versioned_update(fields: dict) -> dict:
+    return {"$set": {**fields, "updated_at": datetime.now(timezone.utc)}, "$inc": {"version": 1}}
+
+
+def car_etag(car: dict) -> str:
+    return f'W/"{car["_id"]}-{car.get("version", 0)}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def car_headers(car: dict, cache_control: str) -> dict:
+    headers = {"ETag": car_etag(car), "Cache-Control": cache_control}
+    updated_at = car.get("updated_at")
+    if updated_at:
+        # MongoDB hands back naive UTC datetimes
+        headers["Last-Modified"] = format_datetime(
+            updated_at.replace(tzinfo=timezone.utc), usegmt=True
+        )
+    return headers
+
+
+def etag_matches(if_none_match: str | None, etag: str | None) -> bool:
+    """Weak comparison, as used for If-None-Match on GET requests"""
+    if not if_none_match or not etag:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -1,9 +1,201 @@
-from decouple import config
+import math
+import os
+
+from decouple import Csv, config
+
+READ_PREFERENCE_MODES = (
+    "primary",
+    "primaryPreferred",
+    "secondary",
+    "secondaryPreferred",
+    "nearest",
+)
+
+
+def route_options(value: str) -> dict[str, str]:
+    """Parse "route=option,..." into {route: option}"""
+    options = {}
+    for item in Csv()(value):
+        route, _, option = item.partition("=")
+        options[route.strip()] = option.strip()
+    return options
+
+
+def rate_limits(value: str) -> dict[str, tuple[float, int]]:
+    """Parse "route=rate:burst,..." into {route: (requests per second, burst)}"""
+    limits = {}
+    for route, rate_burst in route_options(value).items():
+        rate, _, burst = rate_burst.partition(":")
+        if float(rate) <= 0:
+            raise ValueError(f"Rate limit of {route} needs to be positive")
+        limits[route] = (float(rate), int(burst or math.ceil(float(rate))))
+    return limits
+
+
+def read_preferences(value: str) -> dict[str, str]:
+    preferences = route_options(value)
+    for route, mode in preferences.items():
+        if mode not in READ_PREFERENCE_MODES:
+            raise ValueError(f"Unknown read preference {mode} for {route}")
+    return preferences
+
+
+def request_timeouts(value: str) -> dict[str, float]:
+    return {route: float(seconds) for route, seconds in route_options(value).items()}
+
+
+def worker_count(value) -> int:
+    return int(value) or os.cpu_count() or 1
+
+
+class EnvSetting:
+    """Setting read from the environment (or .env) on first access rather than at import, the
+    value then replaces the descriptor on the class"""
+
+    def __init__(self, name: str, **options):
+        self.name = name
+        self.options = options
+
+    def __set_name__(self, owner, attribute: str):
+        self.attribute = attribute
+
+    def __get__(self, instance, owner):
+        value = config(self.name, **self.options)
+        setattr(owner, self.attribute, value)
+        return value
 
 
 class Settings:
-    DB_URL = config("DB_URL", cast=str)
-    DB_NAME = config("DB_NAME", cast=str)
-    COLLECTION_NAME = config("COLLECTION_NAME", cast=str)
+    DB_URL = EnvSetting("DB_URL", cast=str)
+    DB_NAME = EnvSetting("DB_NAME", cast=str)
+    COLLECTION_NAME = EnvSetting("COLLECTION_NAME", cast=str)
     PAGE_LIMIT = 25
     CORS_ORIGINS = ["*"]
+
+    # MongoDB connection pool
+    DB_MAX_POOL_SIZE = EnvSetting("DB_MAX_POOL_SIZE", default=100, cast=int)
+    DB_MIN_POOL_SIZE = EnvSetting("DB_MIN_POOL_SIZE", default=0, cast=int)
+    DB_MAX_IDLE_TIME_MS = EnvSetting("DB_MAX_IDLE_TIME_MS", default=60000, cast=int)
+    DB_WAIT_QUEUE_TIMEOUT_MS = EnvSetting("DB_WAIT_QUEUE_TIMEOUT_MS", default=5000, cast=int)
+    DB_SERVER_SELECTION_TIMEOUT_MS = EnvSetting(
+        "DB_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int
+    )
+    # Total MongoDB connections for the whole server, split between its workers.
+    # 0 gives every worker DB_MAX_POOL_SIZE connections
+    DB_CONNECTION_BUDGET = EnvSetting("DB_CONNECTION_BUDGET", default=0, cast=int)
+
+    # Production server (python -m app.server), SERVER_WORKERS defaults to one per CPU
+    SERVER_HOST = EnvSetting("SERVER_HOST", default="0.0.0.0", cast=str)  # nosec B104
+    SERVER_PORT = EnvSetting("SERVER_PORT", default=8000, cast=int)
+    SERVER_WORKERS = EnvSetting("SERVER_WORKERS", default=0, cast=worker_count)
+    SERVER_BACKLOG = EnvSetting("SERVER_BACKLOG", default=2048, cast=int)
+    SERVER_KEEP_ALIVE = EnvSetting("SERVER_KEEP_ALIVE", default=5, cast=int)
+    SERVER_GRACEFUL_TIMEOUT = EnvSetting("SERVER_GRACEFUL_TIMEOUT", default=30, cast=int)
+    SERVER_ACCESS_LOG = EnvSetting("SERVER_ACCESS_LOG", default=True, cast=bool)
+    FORWARDED_ALLOW_IPS = EnvSetting("FORWARDED_ALLOW_IPS", default="127.0.0.1", cast=str)
+
+    # Seconds between MongoDB pings while the app starts without it, GET /ready answers 503
+    # until one succeeds
+    WARM_UP_RETRY_INTERVAL = EnvSetting("WARM_UP_RETRY_INTERVAL", default=2.0, cast=float)
+
+    # Replica sets: read preference per cars route (endpoint function name) as route=mode, the
+    # other routes and every write go to the primary
+    READ_PREFERENCES = EnvSetting(
+        "READ_PREFERENCES",
+        default="list_all=secondaryPreferred,export_cars=secondaryPreferred",
+        cast=read_preferences,
+    )
+    # Time budget in seconds per cars route as route=seconds, * for unlisted routes and 0 for
+    # none. MongoDB operations get what is left of it as maxTimeMS, requests that run out of it
+    # or hit a MongoDB timeout are answered 503
+    REQUEST_TIMEOUTS = EnvSetting(
+        "REQUEST_TIMEOUTS",
+        default=(
+            "*=5,get_many_cars=15,add_many_cars=60,update_many_cars=60,delete_many_cars=60,"
+            "export_cars=0,stream_changes=0"
+        ),
+        cast=request_timeouts,
+    )
+    TIMEOUT_RETRY_AFTER = EnvSetting("TIMEOUT_RETRY_AFTER", default=1, cast=int)
+
+    # Create the indexes declared in app/indexes.py when the app starts
+    DB_ENSURE_INDEXES = EnvSetting("DB_ENSURE_INDEXES", default=True, cast=bool)
+
+    # Bulk endpoints: maximum items per request and items per unordered write
+    BULK_MAX_ITEMS = EnvSetting("BULK_MAX_ITEMS", default=10000, cast=int)
+    BULK_CHUNK_SIZE = EnvSetting("BULK_CHUNK_SIZE", default=1000, cast=int)
+
+    # Documents fetched per cursor batch and flushed per chunk by GET /cars/export
+    EXPORT_BATCH_SIZE = EnvSetting("EXPORT_BATCH_SIZE", default=1000, cast=int)
+
+    # Response cache: "memory" (per process LRU), "redis" (shared, needs the redis package)
+    # or "none"
+    CACHE_BACKEND = EnvSetting("CACHE_BACKEND", default="memory", cast=str)
+    CACHE_TTL = EnvSetting("CACHE_TTL", default=30, cast=int)
+    CACHE_MAX_ENTRIES = EnvSetting("CACHE_MAX_ENTRIES", default=10000, cast=int)
+    # Seconds the X-Total-Count of a listing is cached for, shared by all its pages
+    TOTAL_COUNT_CACHE_TTL = EnvSetting("TOTAL_COUNT_CACHE_TTL", default=10, cast=int)
+    REDIS_URL = EnvSetting("REDIS_URL", default="redis://localhost:6379/0", cast=str)
+
+    # Cache-Control sent with car details and listings, so a CDN can absorb read traffic
+    CACHE_CONTROL_DETAILS = EnvSetting(
+        "CACHE_CONTROL_DETAILS", default="public, max-age=30, must-revalidate", cast=str
+    )
+    CACHE_CONTROL_LISTINGS = EnvSetting(
+        "CACHE_CONTROL_LISTINGS", default="public, max-age=10, must-revalidate", cast=str
+    )
+
+    # GET /cars/facets: price band boundaries and response cache TTL in seconds
+    FACET_PRICE_BOUNDARIES = EnvSetting(
+        "FACET_PRICE_BOUNDARIES", default="0,5000,10000,20000,50000,100001", cast=Csv(int)
+    )
+    FACETS_CACHE_TTL = EnvSetting("FACETS_CACHE_TTL", default=60, cast=int)
+
+    # Log MongoDB commands slower than this many milliseconds, 0 disables the slow query log
+    SLOW_QUERY_MS = EnvSetting("SLOW_QUERY_MS", default=100, cast=int)
+
+    # Change feed: invalidates and re-warms cached cars on writes from any client, and feeds
+    # GET /cars/stream. Polls updated_at every CHANGE_FEED_POLL_INTERVAL seconds when the
+    # server has no change streams (standalone server, mongomock)
+    CHANGE_FEED_ENABLED = EnvSetting("CHANGE_FEED_ENABLED", default=True, cast=bool)
+    CHANGE_FEED_POLL_INTERVAL = EnvSetting("CHANGE_FEED_POLL_INTERVAL", default=2.0, cast=float)
+    CHANGE_FEED_QUEUE_SIZE = EnvSetting("CHANGE_FEED_QUEUE_SIZE", default=100, cast=int)
+    CHANGE_FEED_HEARTBEAT = EnvSetting("CHANGE_FEED_HEARTBEAT", default=15.0, cast=float)
+
+    # Token bucket rate limits per client and cars route, as route=rate:burst with the route
+    # (endpoint function) name, rate in requests per second, and * for unlisted routes.
+    # Clients are told apart by RATE_LIMIT_KEY_HEADER when it is set, by IP otherwise.
+    # Backend: "memory" (per process), "redis" (shared, needs the redis package) or "none"
+    RATE_LIMITS = EnvSetting(
+        "RATE_LIMITS",
+        default="*=50:100,list_all=20:40,list_facets=10:20,get_many_cars=10:20,export_cars=0.1:2",
+        cast=rate_limits,
+    )
+    RATE_LIMIT_BACKEND = EnvSetting("RATE_LIMIT_BACKEND", default="memory", cast=str)
+    RATE_LIMIT_KEY_HEADER = EnvSetting("RATE_LIMIT_KEY_HEADER", default="", cast=str)
+    RATE_LIMIT_MAX_KEYS = EnvSetting("RATE_LIMIT_MAX_KEYS", default=100000, cast=int)
+
+    # Cars requests served at once per worker before answering 503, 0 disables the cap
+    MAX_DB_REQUESTS_IN_FLIGHT = EnvSetting("MAX_DB_REQUESTS_IN_FLIGHT", default=256, cast=int)
+    OVERLOAD_RETRY_AFTER = EnvSetting("OVERLOAD_RETRY_AFTER", default=1, cast=int)
+
+    # Negotiated response compression, in order of preference: brotli and zstd are offered
+    # when their packages are installed. Smaller single body responses are sent as they are
+    COMPRESSION_ENCODINGS = EnvSetting("COMPRESSION_ENCODINGS", default="zstd,br,gzip", cast=Csv())
+    COMPRESSION_MIN_SIZE = EnvSetting("COMPRESSION_MIN_SIZE", default=1024, cast=int)
+
+    # GET /cars/valuation: price statistics per brand, make, year band and km band, stored in
+    # VALUATION_COLLECTION. Refreshed per bucket after car writes, buckets of more than
+    # VALUATION_REFRESH_MAX_CARS cars only by the full rebuild: python -m app.valuation rebuild
+    # [--numpy]
+    VALUATION_COLLECTION = EnvSetting("VALUATION_COLLECTION", default="car_price_stats", cast=str)
+    VALUATION_YEAR_BAND = EnvSetting("VALUATION_YEAR_BAND", default=5, cast=int)
+    VALUATION_KM_BAND = EnvSetting("VALUATION_KM_BAND", default=50000, cast=int)
+    VALUATION_REFRESH_MAX_CARS = EnvSetting("VALUATION_REFRESH_MAX_CARS", default=10000, cast=int)
+
+    @classmethod
+    def load(cls):
+        """Read every setting not read yet, so a missing or bad value fails the startup"""
+        for attribute, value in list(vars(cls).items()):
+            if isinstance(value, EnvSetting):
+                getattr(cls, attribute)
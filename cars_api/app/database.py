@@ -1,10 +1,58 @@
+from fastapi import Request
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
+from pymongo import ReadPreference
 
 from app.config import Settings
+from app.metrics import MongoCommandMetrics, MongoPoolMetrics
 
+_client: AsyncIOMotorClient | None = None
 
-# MongoDB database dependency
-async def mongodb_client() -> AsyncIOMotorDatabase:
-    database = AsyncIOMotorClient(Settings.DB_URL)
-    client = database[Settings.DB_NAME]
-    yield client
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+
+def pool_size() -> int:
+    """Per worker maxPoolSize, so all workers together stay within DB_CONNECTION_BUDGET"""
+    if not Settings.DB_CONNECTION_BUDGET:
+        return Settings.DB_MAX_POOL_SIZE
+    return max(1, Settings.DB_CONNECTION_BUDGET // Settings.SERVER_WORKERS)
+
+
+def connect_to_mongodb() -> AsyncIOMotorClient:
+    global _client
+    if _client is None:
+        _client = AsyncIOMotorClient(
+            Settings.DB_URL,
+            maxPoolSize=pool_size(),
+            minPoolSize=min(Settings.DB_MIN_POOL_SIZE, pool_size()),
+            maxIdleTimeMS=Settings.DB_MAX_IDLE_TIME_MS,
+            waitQueueTimeoutMS=Settings.DB_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=Settings.DB_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()],
+        )
+    return _client
+
+
+def close_mongodb_connection():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def route_read_preference(request: Request):
+    route = request.scope.get("route")
+    return READ_PREFERENCES[Settings.READ_PREFERENCES.get(getattr(route, "name", None), "primary")]
+
+
+# MongoDB database dependency, backed by the shared client opened in the app lifespan and read
+# with the route's preference (Settings.READ_PREFERENCES)
+async def mongodb_client(request: Request) -> AsyncIOMotorDatabase:
+    yield connect_to_mongodb().get_database(
+        Settings.DB_NAME, read_preference=route_read_preference(request)
+    )
@@ -0,0 +1,107 @@
+import inspect
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Query
+
+from app.models import CarModelBase
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    field: str
+    kind: str  # "range" for min_<field>/max_<field>, "in" for one or many values
+
+
+# Declared from the model: numeric fields filter by range, text fields by a list of values
+FILTER_SPECS = [
+    FilterSpec(name, "range" if field.annotation is int else "in")
+    for name, field in CarModelBase.model_fields.items()
+]
+
+
+@dataclass(frozen=True)
+class CarFilters:
+    ranges: tuple[tuple[str, int | None, int | None], ...] = ()
+    values: tuple[tuple[str, tuple[str, ...]], ...] = ()
+
+    @classmethod
+    def from_params(cls, params: dict) -> "CarFilters":
+        ranges = []
+        values = []
+        for spec in FILTER_SPECS:
+            if spec.kind == "range":
+                low, high = params.get(f"min_{spec.field}"), params.get(f"max_{spec.field}")
+                if low is not None or high is not None:
+                    ranges.append((spec.field, low, high))
+            else:
+                # ?brand=Fiat&brand=Citroen and ?brand=Fiat,Citroen are equivalent
+                selected = {
+                    value.strip()
+                    for param in params.get(spec.field) or []
+                    for value in param.split(",")
+                    if value.strip()
+                }
+                if selected:
+                    values.append((spec.field, tuple(sorted(selected))))
+        return cls(tuple(ranges), tuple(values))
+
+    def query(self) -> dict:
+        """Canonical MongoDB query: equality/$in fields first, then ranges, as indexes expect"""
+        query = {}
+        for field, selected in self.values:
+            query[field] = selected[0] if len(selected) == 1 else {"$in": list(selected)}
+        for field, low, high in self.ranges:
+            bounds = {}
+            if low is not None:
+                bounds["$gte"] = low
+            if high is not None:
+                bounds["$lte"] = high
+            query[field] = bounds
+        return query
+
+    def cache_params(self) -> dict:
+        params = {field: ",".join(selected) for field, selected in self.values}
+        for field, low, high in self.ranges:
+            params[f"min_{field}"] = low
+            params[f"max_{field}"] = high
+        return params
+
+
+def _car_filters_dependency():
+    parameters = []
+    for spec in FILTER_SPECS:
+        if spec.kind == "range":
+            for bound in ("min", "max"):
+                parameters.append(
+                    inspect.Parameter(
+                        f"{bound}_{spec.field}",
+                        inspect.Parameter.KEYWORD_ONLY,
+                        default=Query(
+                            default=None, ge=0, description=f"{bound.title()} {spec.field}"
+                        ),
+                        annotation=Optional[int],
+                    )
+                )
+        else:
+            parameters.append(
+                inspect.Parameter(
+                    spec.field,
+                    inspect.Parameter.KEYWORD_ONLY,
+                    default=Query(
+                        default=None,
+                        description=f"One or more {spec.field} values, repeated or comma separated",
+                    ),
+                    annotation=Optional[list[str]],
+                )
+            )
+
+    def car_filters(**params) -> CarFilters:
+        return CarFilters.from_params(params)
+
+    car_filters.__signature__ = inspect.Signature(parameters, return_annotation=CarFilters)
+    return car_filters
+
+
+# Car filters dependency, its query parameters are generated from FILTER_SPECS
+car_filters = _car_filters_dependency()
@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app.valuation import BUCKET_COLLATION
+
+# Indexes of the cars collection, keyed to the query shapes built by the cars router
+CAR_INDEXES = [
+    # (price, _id) sort with a price range, used without a brand filter. Make, year, km and cm3
+    # filters are not bounded by any listing index: the walk in (price, _id) order checks them on
+    # the documents it fetches, as an index leading with a range field cannot serve that order
+    IndexModel([("price", ASCENDING), ("_id", ASCENDING)], name="price_id"),
+    # brand equality or $in + price range + (price, _id) sort, other filters as above
+    IndexModel(
+        [("brand", ASCENDING), ("price", ASCENDING), ("_id", ASCENDING)], name="brand_price_id"
+    ),
+    IndexModel([("year", ASCENDING), ("km", ASCENDING)], name="year_km"),
+    # multikey edge n-gram index behind list_all?q=, see app/search.py
+    IndexModel(
+        [("search_prefixes", ASCENDING), ("price", ASCENDING)], name="search_prefixes_price"
+    ),
+    # price statistics bucket refresh, price included so it reads no document, compares brand
+    # and make regardless of case, see app/valuation.py
+    IndexModel(
+        [
+            ("brand", ASCENDING),
+            ("make", ASCENDING),
+            ("year", ASCENDING),
+            ("km", ASCENDING),
+            ("price", ASCENDING),
+        ],
+        name="brand_make_year_km_price",
+        collation=BUCKET_COLLATION,
+    ),
+    # polling fallback of the change feed, see app/changes.py
+    IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+]
+
+
+def _index_keys(index: IndexModel) -> list[tuple]:
+    return list(index.document["key"].items())
+
+
+async def missing_indexes(collection: AsyncIOMotorCollection) -> list[str]:
+    existing = await collection.index_information()
+    existing_keys = [list(map(tuple, info["key"])) for info in existing.values()]
+    return [
+        index.document["name"] for index in CAR_INDEXES if _index_keys(index) not in existing_keys
+    ]
+
+
+async def unused_indexes(collection: AsyncIOMotorCollection) -> list[str]:
+    """Indexes that were never used since the last server restart, per $indexStats"""
+    try:
+        stats = await collection.aggregate([{"$indexStats": {}}]).to_list(None)
+    except (NotImplementedError, OperationFailure):
+        return []
+    return [stat["name"] for stat in stats if stat["accesses"]["ops"] == 0]
+
+
+async def ensure_indexes(collection: AsyncIOMotorCollection) -> list[str]:
+    return await collection.create_indexes(CAR_INDEXES)
+
+
+async def _run(command: str):
+    from app.config import Settings
+    from app.database import close_mongodb_connection, connect_to_mongodb
+
+    collection = connect_to_mongodb()[Settings.DB_NAME][Settings.COLLECTION_NAME]
+    try:
+        if command == "ensure":
+            print("Ensured indexes:", ", ".join(await ensure_indexes(collection)))
+        print("Missing indexes:", ", ".join(await missing_indexes(collection)) or "none")
+        print("Unused indexes:", ", ".join(await unused_indexes(collection)) or "none")
+    finally:
+        close_mongodb_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the cars collection indexes")
+    parser.add_argument("command", choices=["ensure", "report"])
+    asyncio.run(_run(parser.parse_args().command))
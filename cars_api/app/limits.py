@@ -0,0 +1,168 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi.responses import JSONResponse
+
+from app.config import Settings
+from app.metrics import REGISTRY, Counter
+from app.routing import route_name
+
+HTTP_REQUESTS_REJECTED = REGISTRY.register(
+    Counter("http_requests_rejected_total", "Requests refused by rate limits or admission control")
+)
+
+
+class NullRateLimitBackend:
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        return 0
+
+    async def clear(self):
+        pass
+
+
+class InMemoryRateLimitBackend:
+    """Per-process token buckets, the least recently used keys are dropped past max_keys"""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        """Take a token, return 0 when allowed or the seconds to wait for the next token"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        if tokens >= 1:
+            tokens, wait = tokens - 1, 0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def clear(self):
+        self._buckets.clear()
+
+
+# Same refill as InMemoryRateLimitBackend.take, atomic on the Redis server
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens, updated = tonumber(bucket[1]) or burst, tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisRateLimitBackend:
+    """Token buckets shared by every worker and instance"""
+
+    def __init__(self, url: str | None = None, client=None):
+        if client is None:
+            from redis.asyncio import Redis
+
+            client = Redis.from_url(url)
+        self.client = client
+
+    async def take(self, key: str, rate: float, burst: int) -> float:
+        wait = await self.client.eval(
+            TOKEN_BUCKET_SCRIPT, 1, f"ratelimit:{key}", rate, burst, time.time()
+        )
+        return float(wait)
+
+    async def clear(self):
+        keys = [key async for key in self.client.scan_iter(match="ratelimit:*")]
+        if keys:
+            await self.client.delete(*keys)
+
+
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    global _rate_limiter
+    if _rate_limiter is None:
+        if Settings.RATE_LIMIT_BACKEND == "redis":
+            _rate_limiter = RedisRateLimitBackend(Settings.REDIS_URL)
+        elif Settings.RATE_LIMIT_BACKEND == "memory":
+            _rate_limiter = InMemoryRateLimitBackend(Settings.RATE_LIMIT_MAX_KEYS)
+        else:
+            _rate_limiter = NullRateLimitBackend()
+    return _rate_limiter
+
+
+def client_key(scope: dict) -> str:
+    if Settings.RATE_LIMIT_KEY_HEADER:
+        header = Settings.RATE_LIMIT_KEY_HEADER.lower().encode()
+        for name, value in scope["headers"]:
+            if name == header:
+                return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def rejection(status_code: int, content: str, retry_after: float) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code,
+        content=content,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Per route rate limits (Settings.RATE_LIMITS) and a cap on DB-bound requests in flight
+
+    Applies to the routes under route_prefix, unbounded_routes (long-lived streams) are rate
+    limited but left out of the in-flight count.
+    """
+
+    def __init__(self, app, route_prefix: str, unbounded_routes: tuple[str, ...] = ()):
+        self.app = app
+        self.route_prefix = route_prefix
+        self.unbounded_routes = set(unbounded_routes)
+        self.in_flight = 0
+
+    def route_name(self, scope: dict) -> str | None:
+        return route_name(scope, self.route_prefix)
+
+    async def __call__(self, scope, receive, send):
+        route = self.route_name(scope) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        bounded = route not in self.unbounded_routes
+        if bounded and 0 < Settings.MAX_DB_REQUESTS_IN_FLIGHT <= self.in_flight:
+            HTTP_REQUESTS_REJECTED.inc(route=route, reason="overloaded")
+            response = rejection(
+                503, "Server busy, please retry later", Settings.OVERLOAD_RETRY_AFTER
+            )
+            await response(scope, receive, send)
+            return
+
+        limit = Settings.RATE_LIMITS.get(route, Settings.RATE_LIMITS.get("*"))
+        if limit:
+            rate, burst = limit
+            wait = await get_rate_limiter().take(f"{route}:{client_key(scope)}", rate, burst)
+            if wait:
+                HTTP_REQUESTS_REJECTED.inc(route=route, reason="rate_limited")
+                response = rejection(429, "Too many requests, please retry later", wait)
+                await response(scope, receive, send)
+                return
+
+        if not bounded:
+            await self.app(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -1,22 +1,100 @@
-import uvicorn
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from motor.motor_asyncio import AsyncIOMotorDatabase
 
+from app.cache import get_cache
+from app.changes import FEED, watch_changes
+from app.compression import CompressionMiddleware
 from app.config import Settings
+from app.database import close_mongodb_connection, connect_to_mongodb, mongodb_client
+from app.limits import AdmissionMiddleware
+from app.metrics import REGISTRY, MetricsMiddleware, server_query_metrics
 from app.routers.cars import cars_router
+from app.routing import RouteMiddleware
+from app.timeouts import TimeoutMiddleware
+from app.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Settings are read on first use, a missing or invalid one fails here rather than in a request
+    Settings.load()
+    client = connect_to_mongodb()
+    collection = client[Settings.DB_NAME][Settings.COLLECTION_NAME]
+    warming = await warm_up(
+        app,
+        client,
+        Settings.WARM_UP_RETRY_INTERVAL,
+        indexed=collection if Settings.DB_ENSURE_INDEXES else None,
+    )
+
+    change_feed = None
+    if Settings.CHANGE_FEED_ENABLED:
+        change_feed = asyncio.create_task(watch_changes(collection, get_cache(), FEED))
+    yield
+    tasks = [task for task in (warming, change_feed) if task]
+    for task in tasks:
+        task.cancel()
+    # change feed failures were logged when they happened
+    await asyncio.gather(*tasks, return_exceptions=True)
+    close_mongodb_connection()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.state.ready = False
 
+# The last added middleware is the outermost
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=Settings.COMPRESSION_MIN_SIZE,
+    encodings=Settings.COMPRESSION_ENCODINGS,
+)
+app.add_middleware(TimeoutMiddleware, route_prefix=cars_router.prefix)
+app.add_middleware(
+    AdmissionMiddleware, route_prefix=cars_router.prefix, unbounded_routes=("stream_changes",)
+)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RouteMiddleware)
+# Outermost, so that the 503 and 429 answers of the middlewares above carry CORS headers too
 app.add_middleware(
     CORSMiddleware,
     allow_origins=Settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Response headers browser clients need to read: paging, caching and retry hints
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag", "Last-Modified", "Retry-After"],
 )
 
 # Registering routers
 app.include_router(cars_router)
 
+
+@app.get("/cache/stats", summary="Response cache hit/miss counters", tags=["Monitoring"])
+async def cache_stats():
+    return get_cache().stats_dict()
+
+
+@app.get("/metrics", summary="Prometheus metrics", tags=["Monitoring"])
+async def metrics(db: AsyncIOMotorDatabase = Depends(mongodb_client)):
+    server_lines = "".join(f"{line}\n" for line in await server_query_metrics(db))
+    return PlainTextResponse(
+        REGISTRY.render() + server_lines, media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/ready", summary="Readiness probe, 503 until warmed up", tags=["Monitoring"])
+async def readiness(request: Request):
+    if not request.app.state.ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content="Warming up")
+    return {"status": "ready"}
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:app", reload=True)
+    from app.server import run
+
+    run(dev=True)
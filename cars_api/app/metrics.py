@@ -0,0 +1,304 @@
+import logging
+import threading
+import time
+
+from bson import json_util
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(labels)} {value}" for labels, value in values
+        ]
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = buckets
+        self._observations: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            # per label set: one counter per bucket, then sum and count
+            counts = self._observations.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    def count(self, **labels) -> int:
+        return self._observations.get(tuple(sorted(labels.items())), [0])[-1]
+
+    def render(self) -> list[str]:
+        with self._lock:
+            observations = [(labels, list(counts)) for labels, counts in self._observations.items()]
+        lines = self.header()
+        for labels, counts in observations:
+            for bound, count in [*zip(self.buckets, counts), ("+Inf", counts[-1])]:
+                bucket_labels = _format_labels((*labels, ("le", bound)))
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {counts[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list[_Metric] = []
+        self.collectors: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """Register a callable returning exposition lines, rendered on every scrape"""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self) -> str:
+        lines = [line for metric in self.metrics for line in metric.render()]
+        for collector in self.collectors:
+            lines.extend(collector())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(
+    Histogram("http_request_duration_seconds", "HTTP request latency by route")
+)
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(
+    Gauge("http_requests_in_flight", "HTTP requests currently being served")
+)
+MONGODB_COMMAND_DURATION = REGISTRY.register(
+    Histogram("mongodb_command_duration_seconds", "MongoDB command latency by command")
+)
+MONGODB_COMMAND_FAILURES = REGISTRY.register(
+    Counter("mongodb_command_failures_total", "Failed MongoDB commands by command")
+)
+MONGODB_DOCUMENTS_RETURNED = REGISTRY.register(
+    Counter("mongodb_documents_returned_total", "Documents returned by MongoDB cursors")
+)
+MONGODB_POOL_CHECKOUT_WAIT = REGISTRY.register(
+    Histogram("mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+)
+
+
+def route_template(scope: dict) -> str:
+    """Path template of the route that served a request, e.g. /cars/{car_id}"""
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
+
+
+class MetricsMiddleware:
+    """Per-route latency histogram and in-flight requests gauge"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_template(scope),
+                status=status_code,
+            )
+
+
+def _returned_documents(reply: dict) -> int | None:
+    cursor = reply.get("cursor")
+    if not isinstance(cursor, dict):
+        return None
+    batch = cursor.get("firstBatch", cursor.get("nextBatch"))
+    return len(batch) if batch is not None else None
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Command durations, returned documents and a slow query log"""
+
+    def __init__(self):
+        self._started: dict[int, dict] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if Settings.SLOW_QUERY_MS:
+            self._started[event.request_id] = event.command
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        command = self._started.pop(event.request_id, None)
+        duration = event.duration_micros / 1_000_000
+        MONGODB_COMMAND_DURATION.observe(duration, command=event.command_name)
+
+        returned = _returned_documents(event.reply)
+        if returned is not None:
+            MONGODB_DOCUMENTS_RETURNED.inc(returned, command=event.command_name)
+
+        if Settings.SLOW_QUERY_MS and duration * 1000 >= Settings.SLOW_QUERY_MS:
+            logger.warning(
+                "Slow MongoDB %s on %s took %.1fms: %s",
+                event.command_name,
+                event.database_name,
+                duration * 1000,
+                json_util.dumps(command)[:1000] if command else "",
+            )
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._started.pop(event.request_id, None)
+        MONGODB_COMMAND_DURATION.observe(
+            event.duration_micros / 1_000_000, command=event.command_name
+        )
+        MONGODB_COMMAND_FAILURES.inc(command=event.command_name)
+
+
+# serverStatus counters of the whole server: documents and index keys examined by queries
+# against documents returned, far more examined than returned means filters no index bounds
+SERVER_QUERY_COUNTERS = [
+    (
+        "mongodb_server_documents_examined_total",
+        "Documents examined by queries on the server",
+        ("metrics", "queryExecutor", "scannedObjects"),
+    ),
+    (
+        "mongodb_server_keys_examined_total",
+        "Index keys examined by queries on the server",
+        ("metrics", "queryExecutor", "scanned"),
+    ),
+    (
+        "mongodb_server_documents_returned_total",
+        "Documents returned by queries on the server",
+        ("metrics", "document", "returned"),
+    ),
+]
+
+
+async def server_query_metrics(database) -> list[str]:
+    """Exposition lines of SERVER_QUERY_COUNTERS, none when serverStatus is not allowed"""
+    try:
+        server_status = await database.command("serverStatus")
+    except (NotImplementedError, PyMongoError) as error:
+        logger.debug("Could not read serverStatus: %s", error)
+        return []
+    lines = []
+    for name, documentation, path in SERVER_QUERY_COUNTERS:
+        value = server_status
+        for key in path:
+            value = value.get(key, {})
+        if isinstance(value, (int, float)):
+            lines += [f"# HELP {name} {documentation}", f"# TYPE {name} counter", f"{name} {value}"]
+    return lines
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection checkout wait, timed per thread since a checkout runs on a single thread"""
+
+    def __init__(self):
+        self._checkouts = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._checkouts.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._checkouts, "started", None)
+        if started is not None:
+            MONGODB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._checkouts.started = None
+
+    def connection_check_out_failed(self, event):
+        self._checkouts.started = None
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
@@ -1,6 +1,6 @@
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from pydantic_mongo import ObjectIdField
 
 
@@ -21,3 +21,39 @@ class CarModelBase(BaseModel):
 
 class CarModelFull(CarModelBase):
     id: Optional[ObjectIdField] = Field(alias="_id")
+
+
+class CarModelPatch(BaseModel):
+    """Partial car update, only the given fields are changed"""
+
+    brand: Optional[str] = Field(default=None, min_length=2)
+    make: Optional[str] = Field(default=None, min_length=2)
+    year: Optional[int] = None
+    cm3: Optional[int] = Field(default=None, ge=1000, le=4000)
+    km: Optional[int] = None
+    price: Optional[int] = Field(default=None, ge=1000, le=100000)
+
+    @field_validator("make", mode="before")
+    @classmethod
+    def make_as_string(cls, make):
+        return make if make is None else str(make)
+
+
+class CarModelCard(BaseModel):
+    """Slim listing row for card UIs"""
+
+    id: Optional[ObjectIdField] = Field(alias="_id")
+    brand: str
+    make: str
+    year: int
+    price: int
+
+    @field_validator("make", mode="before")
+    @classmethod
+    def make_as_string(cls, make):
+        return str(make)
+
+
+def model_projection(model: type[BaseModel]) -> dict:
+    """MongoDB projection fetching only the fields declared by the model"""
+    return {field.alias or name: 1 for name, field in model.model_fields.items()}
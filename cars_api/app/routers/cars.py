@@ -1,26 +1,117 @@
-from typing import Optional
+import asyncio
+import csv
+import io
+import json
+from functools import partial
+from typing import AsyncIterator, Literal, Optional
 
-from fastapi import APIRouter, Depends, Path, Query, status
+from bson import ObjectId
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Path, Query, Request, status
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 
+from app.cache import CachedResponse, ResponseCache, response_cache
+from app.changes import DETAILS_PROJECTION, FEED, cache_car_details, car_events, render_car_details
+from app.conditional import (
+    VERSION_PROJECTION,
+    body_etag,
+    car_etag,
+    car_headers,
+    etag_matches,
+    not_modified,
+    versioned_insert,
+    versioned_update,
+)
 from app.config import Settings
 from app.database import mongodb_client
-from app.models import CarModelBase, CarModelFull
-from app.utils import validate_objectid
+from app.filters import CarFilters, car_filters
+from app.models import CarModelBase, CarModelCard, CarModelFull, CarModelPatch, model_projection
+from app.search import build_search_pipeline, search_tokens, with_search_fields
+from app.serialization import FastJSONResponse, compile_row_converter, dumps
+from app.timeouts import outside_time_budget
+from app.utils import (
+    TooManyItems,
+    chunked,
+    decode_cursor,
+    encode_cursor,
+    parse_json_items,
+    validate_objectid,
+)
+from app.valuation import BUCKET_FIELDS, PERCENTILES, bands, bucket_id, refresh_buckets
 
 cars_router = APIRouter(prefix="/cars", tags=["Cars"])
 
+# Stable listing order, shared by offset and keyset (cursor) pagination
+LIST_SORT = [("price", 1), ("_id", 1)]
+
+LIST_VIEWS = {"full": CarModelFull, "card": CarModelCard}
+# Rows read back from the database were validated on write, they are only reshaped
+ROW_CONVERTERS = {view: compile_row_converter(model) for view, model in LIST_VIEWS.items()}
+CAR_FIELD_ORDER = list(model_projection(CarModelFull))
+CAR_FIELDS = set(CAR_FIELD_ORDER)
+
+EXPORT_FIELDS = ["_id", *(field for field in model_projection(CarModelFull) if field != "_id")]
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def build_list_query(filters: CarFilters, last_seen: Optional[tuple[int, ObjectId]] = None) -> dict:
+    query = filters.query()
+
+    if last_seen:
+        last_price, last_id = last_seen
+        # Keyset pagination: resume right after the last (price, _id) seen
+        query.update(
+            {
+                "$or": [
+                    {"price": {"$gt": last_price}},
+                    {"price": last_price, "_id": {"$gt": last_id}},
+                ]
+            }
+        )
+
+    return query
+
+
+def cached_json_response(cached: CachedResponse) -> Response:
+    return Response(content=cached.body, media_type="application/json", headers=cached.headers)
+
 
 @cars_router.get("/", summary="List all cars")
 async def list_all(
     page: int = Query(default=1, gt=0, description="Page number"),
     page_limit: int = Query(default=Settings.PAGE_LIMIT, gt=0, description="Page item limit"),
-    min_price: int = Query(default=0, gte=0, description="Minimum price"),
-    max_price: int = Query(default=10000, lte=0, description="Maximum price"),
-    brand: Optional[str] = Query(default=None, lte=0, description="Brand name"),
+    cursor: Optional[str] = Query(
+        default=None,
+        description="Opaque cursor from the X-Next-Cursor header of the previous page, "
+        "takes precedence over page",
+    ),
+    filters: CarFilters = Depends(car_filters),
+    q: Optional[str] = Query(
+        default=None,
+        description="Search brand and make by word prefixes, e.g. 'vw golf' or 'merc', "
+        "results are ranked and paged with page",
+    ),
+    view: Literal["full", "card"] = Query(default="full", description="Response row model"),
+    response_format: Literal["rows", "compact"] = Query(
+        default="rows",
+        alias="format",
+        description="rows: a JSON object per car, compact: field names once and a value array "
+        "per car",
+    ),
+    fields: Optional[str] = Query(
+        default=None,
+        description="Comma separated fields to return instead of a view, e.g. brand,make,price",
+    ),
+    include_total: bool = Query(
+        default=False, description="Send the number of matching cars in X-Total-Count"
+    ),
+    if_none_match: Optional[str] = Header(default=None, description="ETag of a cached page"),
     db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
 ):
     if page_limit > Settings.PAGE_LIMIT:
         return JSONResponse(
@@ -28,26 +119,294 @@ async def list_all(
             content=f"Page limit needs to be under {Settings.PAGE_LIMIT}",
         )
 
-    skip_docs = (page - 1) * Settings.PAGE_LIMIT
+    tokens = search_tokens(q) if q else []
+    if tokens and cursor:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content="Cursor pagination is not available for searches, please use page",
+        )
+
+    last_seen = None
+    if cursor:
+        last_seen = decode_cursor(cursor)
+        if not last_seen:
+            return JSONResponse(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                content="Please provide a valid cursor",
+            )
+
+    selected = None
+    if fields is not None:
+        selected = {field.strip() for field in fields.split(",") if field.strip()}
+        if not selected:
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content="Please provide at least one field",
+            )
+        unknown = selected - CAR_FIELDS
+        if unknown:
+            return JSONResponse(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                content=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        # price and _id are always fetched to build the next cursor
+        projection = {field: 1 for field in selected | {"price"}}
+    else:
+        projection = model_projection(LIST_VIEWS[view])
+    # Columns of format=compact, rows always carry _id
+    columns = [
+        field for field in CAR_FIELD_ORDER if field in (selected or projection) or field == "_id"
+    ]
+
+    cache_key = cache.list_key(
+        page=None if cursor else page,
+        page_limit=page_limit,
+        cursor=cursor,
+        **filters.cache_params(),
+        q=" ".join(tokens) or None,
+        view=None if selected else view,
+        fields=",".join(sorted(selected)) if selected else None,
+        # what is actually fetched, two requests only share a page when they read the same fields
+        projection=",".join(sorted(projection)),
+        include_total=include_total or None,
+        format=None if response_format == "rows" else response_format,
+    )
+    cached = await cache.get(cache_key)
+    if cached:
+        if etag_matches(if_none_match, cached.headers.get("ETag")):
+            return not_modified(cached.headers)
+        return cached_json_response(cached)
+
+    count_key = cache.count_key(**filters.cache_params(), q=" ".join(tokens) or None)
+
+    async def count_cars() -> CachedResponse:
+        counted_query = filters.query()
+        if tokens:
+            counted_query["search_prefixes"] = {"$all": tokens}
+        total = await db[Settings.COLLECTION_NAME].count_documents(counted_query)
+        return CachedResponse(body=str(total).encode())
+
+    async def read_total() -> int:
+        # Every page of a listing shares its total, counted once per TOTAL_COUNT_CACHE_TTL
+        counted = await cache.get(count_key)
+        if counted is None:
+            counted = await cache.flights.do(
+                count_key,
+                count_cars,
+                route="list_all_total",
+                store=partial(cache.set, count_key, ttl=Settings.TOTAL_COUNT_CACHE_TTL),
+            )
+        return int(counted.body)
 
-    query = {"price": {"$gt": min_price, "$lt": max_price}}
+    async def load_page() -> CachedResponse:
+        query = build_list_query(filters, last_seen)
+        skip = 0 if cursor else (page - 1) * page_limit
+        collection = db[Settings.COLLECTION_NAME]
 
-    if brand:
-        query.update({"brand": brand})
+        if tokens:
+            pipeline = build_search_pipeline(query, tokens, projection, skip, page_limit)
+            listing = collection.aggregate(pipeline)
+        else:
+            listing = (
+                collection.find(query, projection).sort(LIST_SORT).skip(skip).limit(page_limit)
+            )
 
-    cars = db[Settings.COLLECTION_NAME].find(query).skip(skip_docs).limit(page_limit)
+        async def read_page() -> list[dict]:
+            return [car async for car in listing]
 
-    results = []
+        # The page keeps its indexed query, the total is counted alongside it
+        total = None
+        if include_total:
+            cars, total = await asyncio.gather(read_page(), read_total())
+        else:
+            cars = await read_page()
+
+        row_converter = ROW_CONVERTERS["full" if selected else view]
+        results = []
+        for car in cars:
+            row = row_converter(car)
+            if selected and "price" not in selected:
+                del row["price"]
+            results.append(row)
+
+        headers = {"Cache-Control": Settings.CACHE_CONTROL_LISTINGS}
+        if len(results) == page_limit and not tokens:
+            headers["X-Next-Cursor"] = encode_cursor(cars[-1]["price"], cars[-1]["_id"])
+        if total is not None:
+            headers["X-Total-Count"] = str(total)
+
+        content = results
+        if response_format == "compact":
+            content = {
+                "fields": columns,
+                "rows": [[row.get(field) for field in columns] for row in results],
+            }
+
+        page_response = CachedResponse(body=dumps(content), headers=headers)
+        headers["ETag"] = body_etag(page_response.body)
+        return page_response
+
+    # Identical requests missing the cache together share one query and its rendered body, cached
+    # unless a write lands while it runs
+    page_response = await cache.flights.do(
+        cache_key, load_page, route="list_all", store=partial(cache.set, cache_key)
+    )
+    if etag_matches(if_none_match, page_response.headers["ETag"]):
+        return not_modified(page_response.headers)
+    return cached_json_response(page_response)
+
+
+async def stream_export(cars, export_format: str) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    if export_format == "csv":
+        writer.writeheader()
+
+    rows = 0
     async for car in cars:
-        results.append(CarModelFull(**car))
+        car["_id"] = str(car["_id"])
+        if export_format == "csv":
+            writer.writerow(car)
+        else:
+            buffer.write(json.dumps(car) + "\n")
+
+        rows += 1
+        if rows % Settings.EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+@cars_router.get("/export", summary="Export all matching cars as NDJSON or CSV")
+async def export_cars(
+    export_format: Literal["ndjson", "csv"] = Query(
+        default="ndjson", alias="format", description="Export format"
+    ),
+    filters: CarFilters = Depends(car_filters),
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+):
+    query = build_list_query(filters)
+
+    cars = db[Settings.COLLECTION_NAME].find(query, model_projection(CarModelFull))
+    cars.batch_size(Settings.EXPORT_BATCH_SIZE)
+
+    return StreamingResponse(
+        stream_export(cars, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f"attachment; filename=cars.{export_format}"},
+    )
+
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=jsonable_encoder(results))
+def build_facets_pipeline(query: dict) -> list[dict]:
+    return [
+        {"$match": query},
+        {
+            "$facet": {
+                "total": [{"$count": "count"}],
+                "brands": [
+                    {"$group": {"_id": "$brand", "count": {"$sum": 1}}},
+                    {"$sort": {"count": -1, "_id": 1}},
+                ],
+                "years": [
+                    {"$group": {"_id": "$year", "count": {"$sum": 1}}},
+                    {"$sort": {"_id": -1}},
+                ],
+                "price_bands": [
+                    {
+                        "$bucket": {
+                            "groupBy": "$price",
+                            "boundaries": Settings.FACET_PRICE_BOUNDARIES,
+                            "default": "other",
+                        }
+                    }
+                ],
+            }
+        },
+    ]
+
+
+def format_facets(facets: dict) -> dict:
+    boundaries = Settings.FACET_PRICE_BOUNDARIES
+    upper_bounds = dict(zip(boundaries, boundaries[1:]))
+    return {
+        "total": facets["total"][0]["count"] if facets["total"] else 0,
+        "brands": [{"brand": row["_id"], "count": row["count"]} for row in facets["brands"]],
+        "years": [{"year": row["_id"], "count": row["count"]} for row in facets["years"]],
+        "price_bands": [
+            {"min": row["_id"], "max": upper_bounds.get(row["_id"]), "count": row["count"]}
+            for row in facets["price_bands"]
+            if row["_id"] != "other"
+        ],
+    }
+
+
+@cars_router.get("/facets", summary="Total count and brand, year and price band facets")
+async def list_facets(
+    filters: CarFilters = Depends(car_filters),
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    cache_key = cache.facets_key(**filters.cache_params())
+    cached = await cache.get(cache_key)
+    if cached:
+        return cached_json_response(cached)
+
+    query = build_list_query(filters)
+    facets = await db[Settings.COLLECTION_NAME].aggregate(build_facets_pipeline(query)).to_list(1)
+
+    response = FastJSONResponse(status_code=status.HTTP_200_OK, content=format_facets(facets[0]))
+    await cache.set(cache_key, CachedResponse(body=response.body), ttl=Settings.FACETS_CACHE_TTL)
+    return response
+
+
+@cars_router.get("/stream", summary="Live feed of added, updated and deleted cars")
+async def stream_changes():
+    return StreamingResponse(
+        car_events(FEED, Settings.CHANGE_FEED_HEARTBEAT),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@cars_router.get("/valuation", summary="Price statistics of similar cars")
+async def car_valuation(
+    brand: str = Query(description="Brand name"),
+    make: str = Query(description="Make"),
+    year: int = Query(description="Model year"),
+    km: int = Query(ge=0, description="Mileage"),
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+):
+    year_band, km_band = bands(year, km)
+    stats = await db[Settings.VALUATION_COLLECTION].find_one(
+        {"_id": bucket_id(brand, make, year_band, km_band)}, {"_id": 0, "refreshed_at": 0}
+    )
+    if not stats or not stats["count"]:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND, content="No valuation for this car"
+        )
+
+    return FastJSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={
+            "brand": stats["brand"],
+            "make": stats["make"],
+            "year": {"min": year_band, "max": year_band + Settings.VALUATION_YEAR_BAND - 1},
+            "km": {"min": km_band, "max": km_band + Settings.VALUATION_KM_BAND - 1},
+            "count": stats["count"],
+            "mean": stats["mean"],
+            "percentiles": {f"p{p}": stats[f"p{p}"] for p in PERCENTILES},
+        },
+    )
 
 
 @cars_router.get("/{car_id}", summary="Get one car details by ID")
 async def get_one_car(
     car_id: str = Path(description="Car ID"),
+    if_none_match: Optional[str] = Header(default=None, description="ETag of the cached car"),
     db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
 ):
     car_id = validate_objectid(car_id)
     if not car_id:
@@ -56,19 +415,55 @@ async def get_one_car(
             content="Please provide a valid MongoDB ObjectId",
         )
 
-    car = await db[Settings.COLLECTION_NAME].find_one({"_id": car_id})
-    if not car:
-        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content="Car not found")
+    cache_key = cache.car_key(car_id)
+    cached = await cache.get(cache_key)
+    if cached:
+        if etag_matches(if_none_match, cached.headers.get("ETag")):
+            return not_modified(cached.headers)
+        return cached_json_response(cached)
 
-    return JSONResponse(
-        status_code=status.HTTP_200_OK,
-        content=jsonable_encoder(CarModelFull(**car)),
+    if if_none_match:
+        # Revalidation only needs the version fields, not the whole document
+        version = await db[Settings.COLLECTION_NAME].find_one({"_id": car_id}, VERSION_PROJECTION)
+        if version and etag_matches(if_none_match, car_etag(version)):
+            return not_modified(car_headers(version, Settings.CACHE_CONTROL_DETAILS))
+
+    async def load_car() -> CachedResponse | None:
+        car = await db[Settings.COLLECTION_NAME].find_one({"_id": car_id}, DETAILS_PROJECTION)
+        return render_car_details(car) if car else None
+
+    # Identical requests missing the cache together share one query and its rendered body
+    details = await cache.flights.do(
+        cache_key, load_car, route="get_one_car", store=partial(cache.set, cache_key)
     )
+    if not details:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content="Car not found")
+
+    return cached_json_response(details)
+
+
+def refresh_valuation(
+    background_tasks: BackgroundTasks, db: AsyncIOMotorDatabase, written: list[dict]
+):
+    """Refresh the price statistics buckets of the written cars, before and after their writes,
+    once the response is sent"""
+    if written:
+        background_tasks.add_task(
+            outside_time_budget(refresh_buckets),
+            db[Settings.COLLECTION_NAME],
+            db[Settings.VALUATION_COLLECTION],
+            written,
+        )
 
 
 @cars_router.post("/", summary="Add a new car")
-async def add_new_car(new_car: CarModelBase, db: AsyncIOMotorDatabase = Depends(mongodb_client)):
-    new_car = new_car.dict()
+async def add_new_car(
+    new_car: CarModelBase,
+    background_tasks: BackgroundTasks,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    new_car = versioned_insert(with_search_fields(new_car.dict()))
 
     doc = await db[Settings.COLLECTION_NAME].insert_one(new_car)
     if not doc:
@@ -77,38 +472,106 @@ async def add_new_car(new_car: CarModelBase, db: AsyncIOMotorDatabase = Depends(
             content="Request not accepted",
         )
 
-    new_car = await db[Settings.COLLECTION_NAME].find_one({"_id": doc.inserted_id})
-    return JSONResponse(
-        status_code=status.HTTP_201_CREATED,
-        content=jsonable_encoder(CarModelFull(**new_car)),
+    await cache.invalidate_cars()
+    refresh_valuation(background_tasks, db, [new_car])
+
+    # The stored document is the payload plus its _id, no need to read it back
+    response = cached_json_response(
+        await cache_car_details(cache, {**new_car, "_id": doc.inserted_id})
     )
+    response.status_code = status.HTTP_201_CREATED
+    return response
+
+
+async def update_car(
+    db: AsyncIOMotorDatabase,
+    cache: ResponseCache,
+    background_tasks: BackgroundTasks,
+    car_id,
+    fields: dict,
+):
+    update = versioned_update(fields)
+    # The pre-image tells which price statistics bucket the car leaves, the stored document is
+    # the pre-image with the update applied
+    previous = await db[Settings.COLLECTION_NAME].find_one_and_update(
+        {"_id": car_id}, update, projection=DETAILS_PROJECTION
+    )
+    if not previous:
+        return JSONResponse(
+            status_code=status.HTTP_404_NOT_FOUND,
+            content={"message": "No matched records"},
+        )
+    car = {
+        **previous,
+        **{name: value for name, value in update["$set"].items() if name in DETAILS_PROJECTION},
+        "version": previous.get("version", 0) + 1,
+    }
+
+    await cache.invalidate_cars(car_id)
+    refresh_valuation(background_tasks, db, [previous, car])
+    return cached_json_response(await cache_car_details(cache, car))
 
 
 @cars_router.put("/", summary="Update car information")
 async def update_car_information(
-    car_data: CarModelFull, db: AsyncIOMotorDatabase = Depends(mongodb_client)
+    car_data: CarModelFull,
+    background_tasks: BackgroundTasks,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
 ):
     car_data = car_data.dict(exclude_none=True, exclude_unset=True)
 
-    car_id = validate_objectid(car_data.get("id"))
+    car_id = validate_objectid(car_data.pop("id", None) or "")
+
+    return await update_car(db, cache, background_tasks, car_id, with_search_fields(car_data))
 
-    update_results = await db[Settings.COLLECTION_NAME].update_one(
-        {"_id": car_id}, {"$set": car_data}
-    )
 
-    if update_results.matched_count == 0:
+@cars_router.patch("/{car_id}", summary="Update some of a car information")
+async def patch_car_information(
+    car_patch: CarModelPatch,
+    background_tasks: BackgroundTasks,
+    car_id: str = Path(description="Car ID"),
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    car_id = validate_objectid(car_id)
+    if not car_id:
         return JSONResponse(
-            status_code=status.HTTP_404_NOT_FOUND,
-            content={"message": "No matched records"},
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content="Please provide a valid MongoDB ObjectId",
         )
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Success"})
+    fields = car_patch.dict(exclude_none=True)
+    if not fields:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content="Please provide at least one field to update",
+        )
+
+    if fields.keys() & {"brand", "make"}:
+        names = {"brand", "make"} - fields.keys()
+        if names:
+            # The search fields need both names, fetch the one left unchanged
+            car = await db[Settings.COLLECTION_NAME].find_one(
+                {"_id": car_id}, {name: 1 for name in names}
+            )
+            if not car:
+                return JSONResponse(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    content={"message": "No matched records"},
+                )
+            fields = {**fields, **{name: car[name] for name in names}}
+        fields = with_search_fields(fields)
+
+    return await update_car(db, cache, background_tasks, car_id, fields)
 
 
 @cars_router.delete("/", summary="Delete one car")
 async def delete_one_car(
+    background_tasks: BackgroundTasks,
     car_id: str = Query(description="The car ID to be deleted"),
     db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
 ):
     car_id = validate_objectid(car_id)
 
@@ -118,12 +581,244 @@ async def delete_one_car(
             content="Please provide a valid ObjectID as car ID",
         )
 
-    delete_status = await db[Settings.COLLECTION_NAME].delete_one({"_id": car_id})
+    car = await db[Settings.COLLECTION_NAME].find_one_and_delete(
+        {"_id": car_id}, projection=BUCKET_FIELDS
+    )
 
-    if delete_status.deleted_count == 0:
+    if not car:
         return JSONResponse(
             status_code=status.HTTP_404_NOT_FOUND,
             content={"message": "Car not found"},
         )
 
+    await cache.invalidate_cars(car_id)
+    refresh_valuation(background_tasks, db, [car])
     return JSONResponse(status_code=status.HTTP_200_OK, content={"message": "Success"})
+
+
+async def read_bulk_items(request: Request) -> tuple[list, JSONResponse | None]:
+    try:
+        items = parse_json_items(
+            await request.body(), request.headers.get("content-type", ""), Settings.BULK_MAX_ITEMS
+        )
+    except TooManyItems:
+        return [], JSONResponse(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            content=f"Bulk requests need to be under {Settings.BULK_MAX_ITEMS} items",
+        )
+    if items is None:
+        return [], JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content="Please provide a JSON array or an NDJSON body",
+        )
+    return items, None
+
+
+def bulk_response(results: list[dict], succeeded_status: str) -> JSONResponse:
+    succeeded = sum(1 for result in results if result["status"] == succeeded_status)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content=jsonable_encoder(
+            {succeeded_status: succeeded, "failed": len(results) - succeeded, "results": results}
+        ),
+    )
+
+
+def bulk_error(index: int, errors: list) -> dict:
+    return {"index": index, "status": "error", "errors": errors}
+
+
+def validate_bulk_item(index: int, item, model: type[CarModelBase]) -> tuple[dict | None, dict]:
+    if not isinstance(item, dict):
+        return bulk_error(index, ["Item needs to be a JSON object"]), {}
+    try:
+        return None, model(**item).dict()
+    except ValidationError as validation_error:
+        return bulk_error(index, validation_error.errors(include_url=False)), {}
+
+
+@cars_router.post("/bulk", summary="Add many cars from a JSON array or NDJSON body")
+async def add_many_cars(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    items, error = await read_bulk_items(request)
+    if error:
+        return error
+
+    results = [None] * len(items)
+    new_cars = []
+    written = []
+    for index, item in enumerate(items):
+        results[index], new_car = validate_bulk_item(index, item, CarModelBase)
+        if new_car:
+            new_cars.append((index, versioned_insert(with_search_fields(new_car))))
+
+    for chunk in chunked(new_cars, Settings.BULK_CHUNK_SIZE):
+        failed = {}
+        try:
+            await db[Settings.COLLECTION_NAME].insert_many(
+                [new_car for _, new_car in chunk], ordered=False
+            )
+        except BulkWriteError as write_error:
+            failed = {err["index"]: err["errmsg"] for err in write_error.details["writeErrors"]}
+
+        for position, (index, new_car) in enumerate(chunk):
+            if position in failed:
+                results[index] = bulk_error(index, [failed[position]])
+            else:
+                results[index] = {"index": index, "status": "inserted", "_id": str(new_car["_id"])}
+                written.append(new_car)
+
+    await cache.invalidate_cars()
+    refresh_valuation(background_tasks, db, written)
+    return bulk_response(results, "inserted")
+
+
+@cars_router.put("/bulk", summary="Update many cars from a JSON array or NDJSON body")
+async def update_many_cars(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    items, error = await read_bulk_items(request)
+    if error:
+        return error
+
+    results = [None] * len(items)
+    updates = []
+    for index, item in enumerate(items):
+        results[index], car_data = validate_bulk_item(index, item, CarModelFull)
+        if not car_data:
+            continue
+        car_id = validate_objectid(car_data.pop("id") or "")
+        if car_id is None:
+            results[index] = bulk_error(index, ["Please provide the car _id"])
+        else:
+            updates.append((index, car_id, car_data))
+
+    # The pre-read tells which cars exist and which price statistics bucket each one leaves
+    collection = db[Settings.COLLECTION_NAME]
+    written = []
+    for chunk in chunked(updates, Settings.BULK_CHUNK_SIZE):
+        existing = {
+            car["_id"]: car
+            async for car in collection.find(
+                {"_id": {"$in": [car_id for _, car_id, _ in chunk]}}, BUCKET_FIELDS
+            )
+        }
+        matched = [
+            (index, car_id, car_data) for index, car_id, car_data in chunk if car_id in existing
+        ]
+
+        failed = {}
+        if matched:
+            try:
+                await collection.bulk_write(
+                    [
+                        UpdateOne({"_id": car_id}, versioned_update(with_search_fields(car_data)))
+                        for _, car_id, car_data in matched
+                    ],
+                    ordered=False,
+                )
+            except BulkWriteError as write_error:
+                failed = {
+                    matched[err["index"]][0]: err["errmsg"]
+                    for err in write_error.details["writeErrors"]
+                }
+
+        for index, car_id, car_data in chunk:
+            if car_id not in existing:
+                results[index] = bulk_error(index, ["Car not found"])
+            elif index in failed:
+                results[index] = bulk_error(index, [failed[index]])
+            else:
+                results[index] = {"index": index, "status": "updated", "_id": str(car_id)}
+                written += [existing[car_id], car_data]
+
+    await cache.invalidate_cars(*(car_id for _, car_id, _ in updates))
+    refresh_valuation(background_tasks, db, written)
+    return bulk_response(results, "updated")
+
+
+@cars_router.delete("/bulk", summary="Delete many cars from a JSON array or NDJSON body of IDs")
+async def delete_many_cars(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+    cache: ResponseCache = Depends(response_cache),
+):
+    items, error = await read_bulk_items(request)
+    if error:
+        return error
+
+    results = [None] * len(items)
+    deletions = []
+    for index, item in enumerate(items):
+        car_id = validate_objectid(item) if isinstance(item, str) else None
+        if car_id is None:
+            results[index] = bulk_error(index, ["Please provide a valid ObjectID as car ID"])
+        else:
+            deletions.append((index, car_id))
+
+    # The pre-read tells which cars exist and which price statistics bucket each one leaves
+    collection = db[Settings.COLLECTION_NAME]
+    written = []
+    for chunk in chunked(deletions, Settings.BULK_CHUNK_SIZE):
+        existing = {
+            car["_id"]: car
+            async for car in collection.find(
+                {"_id": {"$in": [car_id for _, car_id in chunk]}}, BUCKET_FIELDS
+            )
+        }
+        if existing:
+            await collection.delete_many({"_id": {"$in": list(existing)}})
+
+        for index, car_id in chunk:
+            if car_id in existing:
+                results[index] = {"index": index, "status": "deleted", "_id": str(car_id)}
+                written.append(existing[car_id])
+            else:
+                results[index] = bulk_error(index, ["Car not found"])
+
+    await cache.invalidate_cars(*(car_id for _, car_id in deletions))
+    refresh_valuation(background_tasks, db, written)
+    return bulk_response(results, "deleted")
+
+
+@cars_router.post("/batch-get", summary="Get many cars by ID from a JSON array or NDJSON body")
+async def get_many_cars(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(mongodb_client),
+):
+    items, error = await read_bulk_items(request)
+    if error:
+        return error
+
+    results = [None] * len(items)
+    # Duplicate IDs share one lookup, each occurrence gets its own result
+    lookups: dict[ObjectId, list[int]] = {}
+    for index, item in enumerate(items):
+        car_id = validate_objectid(item) if isinstance(item, str) else None
+        if car_id is None:
+            results[index] = bulk_error(index, ["Please provide a valid ObjectID as car ID"])
+        else:
+            lookups.setdefault(car_id, []).append(index)
+
+    for car_ids in chunked(list(lookups), Settings.BULK_CHUNK_SIZE):
+        cars = db[Settings.COLLECTION_NAME].find(
+            {"_id": {"$in": car_ids}}, model_projection(CarModelFull)
+        )
+        async for car in cars:
+            row = ROW_CONVERTERS["full"](car)
+            for index in lookups.pop(car["_id"]):
+                results[index] = {"index": index, "status": "found", "car": row}
+
+    for indexes in lookups.values():
+        for index in indexes:
+            results[index] = bulk_error(index, ["Car not found"])
+
+    return bulk_response(results, "found")
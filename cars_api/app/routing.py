@@ -0,0 +1,36 @@
+from starlette.routing import BaseRoute, Match
+
+
+def match_route(scope: dict) -> BaseRoute | None:
+    """Route a request is for, matched the way the router will"""
+    for route in scope["app"].router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route
+    return None
+
+
+def route_name(scope: dict, route_prefix: str) -> str | None:
+    """Name of the route under route_prefix a request is for, as resolved by RouteMiddleware"""
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", "").startswith(route_prefix):
+        return route.name
+    return None
+
+
+class RouteMiddleware:
+    """Match each request to its route once, ahead of the middlewares that need it
+
+    The route is kept in scope["route"], where the router leaves it too once it has routed the
+    request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            route = match_route(scope)
+            if route is not None:
+                scope["route"] = route
+        await self.app(scope, receive, send)
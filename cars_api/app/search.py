@@ -0,0 +1,117 @@
+import argparse
+import asyncio
+import re
+import unicodedata
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import UpdateOne
+
+# Extra search terms indexed with a brand, so "vw golf" finds Volkswagen Golf
+BRAND_ALIASES = {
+    "volkswagen": ["vw"],
+    "mercedes": ["merc", "mb"],
+    "chevrolet": ["chevy"],
+    "alfa": ["alfaromeo"],
+}
+MAX_PREFIX_LENGTH = 15
+
+_TOKEN_SEPARATORS = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> list[str]:
+    """Lowercase, accent-free alphanumeric tokens"""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode().lower()
+    return [token for token in _TOKEN_SEPARATORS.split(text) if token]
+
+
+def search_terms(brand: str, make) -> list[str]:
+    terms = normalize(f"{brand} {make}")
+    for term in list(terms):
+        terms.extend(BRAND_ALIASES.get(term, []))
+    return list(dict.fromkeys(terms))
+
+
+def edge_ngrams(terms: list[str]) -> list[str]:
+    return list(
+        dict.fromkeys(
+            term[:length]
+            for term in terms
+            for length in range(1, min(len(term), MAX_PREFIX_LENGTH) + 1)
+        )
+    )
+
+
+def with_search_fields(car: dict) -> dict:
+    terms = search_terms(car["brand"], car["make"])
+    return {**car, "search_terms": terms, "search_prefixes": edge_ngrams(terms)}
+
+
+def search_tokens(q: str) -> list[str]:
+    return [token[:MAX_PREFIX_LENGTH] for token in normalize(q)]
+
+
+def build_search_pipeline(
+    query: dict, tokens: list[str], projection: dict, skip: int, limit: int
+) -> list[dict]:
+    """Match every token as a prefix through the multikey index, rank exact term matches first"""
+    return [
+        {"$match": {**query, "search_prefixes": {"$all": tokens}}},
+        {
+            "$addFields": {
+                "search_score": {
+                    "$add": [
+                        {"$cond": [{"$in": [token, "$search_terms"]}, 1, 0]} for token in tokens
+                    ]
+                }
+            }
+        },
+        {"$sort": {"search_score": -1, "price": 1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": projection},
+    ]
+
+
+async def backfill_search_fields(collection: AsyncIOMotorCollection, batch_size: int = 1000) -> int:
+    """Add the search fields to cars written before they existed"""
+    updated = 0
+    operations = []
+    cars = collection.find({"search_prefixes": {"$exists": False}}, {"brand": 1, "make": 1})
+    cars.batch_size(batch_size)
+    async for car in cars:
+        fields = with_search_fields(car)
+        operations.append(
+            UpdateOne(
+                {"_id": car["_id"]},
+                {
+                    "$set": {
+                        "search_terms": fields["search_terms"],
+                        "search_prefixes": fields["search_prefixes"],
+                    }
+                },
+            )
+        )
+        if len(operations) == batch_size:
+            updated += (await collection.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await collection.bulk_write(operations, ordered=False)).modified_count
+    return updated
+
+
+async def _run():
+    from app.config import Settings
+    from app.database import close_mongodb_connection, connect_to_mongodb
+
+    collection = connect_to_mongodb()[Settings.DB_NAME][Settings.COLLECTION_NAME]
+    try:
+        print("Cars updated:", await backfill_search_fields(collection))
+    finally:
+        close_mongodb_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the cars search fields")
+    parser.add_argument("command", choices=["backfill"])
+    parser.parse_args()
+    asyncio.run(_run())
@@ -0,0 +1,56 @@
+import json
+from typing import Any, Callable, get_args
+
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is an optional accelerator
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered by orjson when it is installed"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _field_converter(key: str, annotation) -> Callable | None:
+    if key == "_id":
+        return str
+    annotation = next((arg for arg in get_args(annotation) if arg is not type(None)), annotation)
+    if annotation in (str, int):
+        return annotation
+    return None
+
+
+def compile_row_converter(model: type[BaseModel]) -> Callable[[dict], dict]:
+    """Shape trusted MongoDB documents like the model's JSON output, without validating them"""
+    converters = [
+        (field.alias or name, _field_converter(field.alias or name, field.annotation))
+        for name, field in model.model_fields.items()
+    ]
+
+    def convert(document: dict) -> dict:
+        return {
+            key: converter(document[key]) if converter else document[key]
+            for key, converter in converters
+            if key in document
+        }
+
+    return convert
@@ -0,0 +1,55 @@
+import argparse
+import importlib.util
+import logging
+import os
+
+import uvicorn
+
+from app.config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def event_loop() -> str:
+    return "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    return "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+
+def run(dev: bool = False):
+    if dev:
+        uvicorn.run(
+            "app.main:app", host=Settings.SERVER_HOST, port=Settings.SERVER_PORT, reload=True
+        )
+        return
+
+    # Worker processes read it back to size their MongoDB pool, see app/database.py
+    os.environ["SERVER_WORKERS"] = str(Settings.SERVER_WORKERS)
+    loop, http = event_loop(), http_protocol()
+    logger.info("Starting %s workers on %s with %s", Settings.SERVER_WORKERS, loop, http)
+    # No limit_max_requests: the uvicorn 0.27 supervisor does not respawn workers that exit, so
+    # recycling them would shut the server down one worker at a time.
+    # On SIGTERM the workers stop accepting connections, let in-flight requests finish for up
+    # to SERVER_GRACEFUL_TIMEOUT seconds, then run the app shutdown
+    uvicorn.run(
+        "app.main:app",
+        host=Settings.SERVER_HOST,
+        port=Settings.SERVER_PORT,
+        workers=Settings.SERVER_WORKERS,
+        loop=loop,
+        http=http,
+        backlog=Settings.SERVER_BACKLOG,
+        timeout_keep_alive=Settings.SERVER_KEEP_ALIVE,
+        timeout_graceful_shutdown=Settings.SERVER_GRACEFUL_TIMEOUT,
+        forwarded_allow_ips=Settings.FORWARDED_ALLOW_IPS,
+        access_log=Settings.SERVER_ACCESS_LOG,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the cars API")
+    parser.add_argument("--dev", action="store_true", help="single process with auto reload")
+    logging.basicConfig(level=logging.INFO)
+    run(parser.parse_args().dev)
@@ -0,0 +1,68 @@
+import asyncio
+from functools import partial
+from typing import Awaitable, Callable, TypeVar
+
+from app.metrics import REGISTRY, Counter
+
+SINGLE_FLIGHT_CALLS = REGISTRY.register(
+    Counter("single_flight_calls_total", "Calls run on behalf of coalesced requests, by route")
+)
+SINGLE_FLIGHT_COLLAPSED = REGISTRY.register(
+    Counter("single_flight_collapsed_total", "Requests served by an identical call in flight")
+)
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Identical concurrent calls share one call in flight and its result
+
+    The call runs in its own task, so a caller giving up (client gone, time budget spent) does not
+    fail the others waiting on it. Keys are dropped once the call is done, later callers run it
+    again. A call forgotten while in flight still answers its callers, but its result is not
+    stored: it may have read data older than the write that forgot it.
+    """
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Task] = {}
+
+    async def do(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[T]],
+        route: str,
+        store: Callable[[T], Awaitable] | None = None,
+    ) -> T:
+        """Result of call, shared with the identical calls in flight
+
+        store, e.g. a cache write, gets the result unless it is None or the call was forgotten.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            SINGLE_FLIGHT_CALLS.inc(route=route)
+            task = asyncio.ensure_future(self._run(key, call, store))
+            self._calls[key] = task
+            task.add_done_callback(partial(self._done, key))
+        else:
+            SINGLE_FLIGHT_COLLAPSED.inc(route=route)
+        return await asyncio.shield(task)
+
+    async def _run(self, key: str, call: Callable[[], Awaitable[T]], store) -> T:
+        result = await call()
+        forgotten = self._calls.get(key) is not asyncio.current_task()
+        if store is not None and result is not None and not forgotten:
+            await store(result)
+        return result
+
+    def forget(self, *keys: str, prefix: str | None = None):
+        """Let the next callers start a new call and keep the calls in flight from storing their
+        results, e.g. once the data they read changed"""
+        for key in [key for key in self._calls if key in keys or prefix and key.startswith(prefix)]:
+            del self._calls[key]
+
+    def _done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # raised to the callers, retrieved here in case all of them left
+            task.exception()
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import logging
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+from app.config import Settings
+from app.limits import rejection
+from app.metrics import REGISTRY, Counter
+from app.routing import route_name
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUESTS_TIMED_OUT = REGISTRY.register(
+    Counter("http_requests_timed_out_total", "Requests answered 503 on a time budget or DB timeout")
+)
+
+
+def request_timeout(route: str) -> float:
+    return Settings.REQUEST_TIMEOUTS.get(route, Settings.REQUEST_TIMEOUTS.get("*", 0))
+
+
+def outside_time_budget(call):
+    """Run a background task without the MongoDB time budget of the request that scheduled it"""
+
+    @functools.wraps(call)
+    async def run(*args, **kwargs):
+        # pymongo.timeout(None) turns the enclosing deadline off rather than shortening it
+        with pymongo.timeout(None):
+            return await call(*args, **kwargs)
+
+    return run
+
+
+class TimeoutMiddleware:
+    """Time budget per cars route (Settings.REQUEST_TIMEOUTS)
+
+    Within the budget pymongo.timeout gives every MongoDB operation what is left of it as
+    maxTimeMS, pool wait and server selection timeout, and the request is cancelled once it is
+    spent before its last response body is sent. Background tasks run after that body, out of the
+    budget (see outside_time_budget for their MongoDB operations). Spent budgets and MongoDB
+    timeouts are answered 503 unless the response has started.
+    """
+
+    def __init__(self, app, route_prefix: str):
+        self.app = app
+        self.route_prefix = route_prefix
+
+    async def __call__(self, scope, receive, send):
+        route = route_name(scope, self.route_prefix) if scope["type"] == "http" else None
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+        budget_spent = False
+        request = asyncio.current_task()
+
+        def spend_budget():
+            nonlocal budget_spent
+            budget_spent = True
+            request.cancel()
+
+        timeout = request_timeout(route)
+        expiry = asyncio.get_running_loop().call_later(timeout, spend_budget) if timeout else None
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                if expiry:
+                    expiry.cancel()
+            await send(message)
+
+        try:
+            with pymongo.timeout(timeout or None):
+                await self.app(scope, receive, tracking_send)
+        except asyncio.CancelledError:
+            if not budget_spent:
+                raise
+            if hasattr(request, "uncancel"):
+                # Python 3.11+ counts pending cancellations, this one is handled here
+                request.uncancel()
+            error = asyncio.TimeoutError()
+            if response_started:
+                raise error
+        except PyMongoError as mongo_error:
+            if response_started or not mongo_error.timeout:
+                raise
+            error = mongo_error
+        else:
+            return
+        finally:
+            if expiry:
+                expiry.cancel()
+
+        HTTP_REQUESTS_TIMED_OUT.inc(route=route)
+        logger.warning("%s timed out: %s", route, str(error) or f"over its {timeout}s budget")
+        response = rejection(
+            503, "Database timeout, please retry later", Settings.TIMEOUT_RETRY_AFTER
+        )
+        await response(scope, receive, send)
@@ -1,3 +1,9 @@
+import base64
+import json
+import re
+from itertools import islice
+from typing import Iterable, Iterator
+
 from bson import ObjectId
 from bson.errors import InvalidId
 
@@ -9,3 +15,77 @@ def validate_objectid(objectid_str: str) -> ObjectId | None:
         return None
     else:
         return objectId
+
+
+def encode_cursor(price: int, objectid: ObjectId | str) -> str:
+    payload = json.dumps([price, str(objectid)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, ObjectId] | None:
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        price, objectid_str = json.loads(payload)
+    except (ValueError, TypeError):
+        return None
+
+    if not isinstance(price, int) or not isinstance(objectid_str, str):
+        return None
+    objectid = validate_objectid(objectid_str)
+    if objectid is None:
+        return None
+    return price, objectid
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+_WHITESPACE = re.compile(r"\s*")
+
+
+class TooManyItems(Exception):
+    pass
+
+
+def json_array_items(text: str) -> Iterator:
+    """Decode the items of a JSON array one at a time"""
+    decoder = json.JSONDecoder()
+    position = _WHITESPACE.match(text).end()
+    if not text.startswith("[", position):
+        raise ValueError("Expected a JSON array")
+    position = _WHITESPACE.match(text, position + 1).end()
+    if not text.startswith("]", position):
+        while True:
+            item, position = decoder.raw_decode(text, position)
+            yield item
+            position = _WHITESPACE.match(text, position).end()
+            if text.startswith("]", position):
+                break
+            if not text.startswith(",", position):
+                raise ValueError("Expected , or ] in the JSON array")
+            position = _WHITESPACE.match(text, position + 1).end()
+    if _WHITESPACE.match(text, position + 1).end() != len(text):
+        raise ValueError("Extra data after the JSON array")
+
+
+def parse_json_items(body: bytes, content_type: str, max_items: int) -> list | None:
+    """Parse a JSON array, or one JSON document per line for NDJSON content types
+
+    Raises TooManyItems as soon as the body goes over max_items, without parsing the rest.
+    """
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            items = (json.loads(line) for line in body.splitlines() if line.strip())
+        else:
+            items = json_array_items(body.decode())
+        parsed = []
+        for item in items:
+            if len(parsed) == max_items:
+                raise TooManyItems(max_items)
+            parsed.append(item)
+    except ValueError:
+        return None
+    return parsed
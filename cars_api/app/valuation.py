@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import importlib.util
+import logging
+from datetime import datetime, timezone
+from typing import Iterable
+
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
+
+from app.config import Settings
+from app.utils import chunked
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = (10, 25, 50, 75, 90)
+DUPLICATE_KEY = 11000
+BUCKET_FIELDS = {"brand": 1, "make": 1, "year": 1, "km": 1}
+# Case insensitive comparison of brand and make, shared by the bucket index and its queries
+BUCKET_COLLATION = {"locale": "en", "strength": 2}
+
+
+def bands(year: int, km: int) -> tuple[int, int]:
+    return year - year % Settings.VALUATION_YEAR_BAND, km - km % Settings.VALUATION_KM_BAND
+
+
+def bucket_name(brand, make) -> tuple[str, str]:
+    """Brand and make the way buckets compare them: as text, whatever their case, like
+    BUCKET_COLLATION compares them in the database"""
+    return str(brand).casefold(), str(make).casefold()
+
+
+def bucket_id(brand: str, make: str, year_band: int, km_band: int) -> str:
+    return "|".join([*bucket_name(brand, make), str(year_band), str(km_band)])
+
+
+def car_bucket(car: dict) -> tuple[str, str, int, int]:
+    """Brand, make, year band and km band of a car"""
+    return (car["brand"], str(car["make"]), *bands(car["year"], car["km"]))
+
+
+def bucket_query(brand: str, make: str, year_band: int, km_band: int) -> dict:
+    """Cars of a bucket, served by the brand_make_year_km_price index when run with
+    BUCKET_COLLATION, makes stored as numbers included"""
+    make = str(make)
+    return {
+        "brand": str(brand),
+        "make": {"$in": [make, int(make)]} if make.isdecimal() else make,
+        "year": {"$gte": year_band, "$lt": year_band + Settings.VALUATION_YEAR_BAND},
+        "km": {"$gte": km_band, "$lt": km_band + Settings.VALUATION_KM_BAND},
+    }
+
+
+def summarize(sorted_prices: list) -> dict:
+    """Count, mean and percentiles, interpolated linearly between the closest ranks like
+    numpy.percentile does by default"""
+    summary = {
+        "count": len(sorted_prices),
+        "mean": round(sum(sorted_prices) / len(sorted_prices)),
+    }
+    for percentile in PERCENTILES:
+        position = (len(sorted_prices) - 1) * percentile / 100
+        lower = int(position)
+        upper = min(lower + 1, len(sorted_prices) - 1)
+        value = sorted_prices[lower] + (sorted_prices[upper] - sorted_prices[lower]) * (
+            position - lower
+        )
+        summary[f"p{percentile}"] = round(value)
+    return summary
+
+
+def stats_document(brand, make, year_band, km_band, summary: dict, refreshed_at) -> dict:
+    return {
+        "_id": bucket_id(brand, make, year_band, km_band),
+        "brand": brand,
+        "make": make,
+        "year_band": year_band,
+        "km_band": km_band,
+        **summary,
+        "refreshed_at": refreshed_at,
+    }
+
+
+async def refresh_bucket(
+    cars: AsyncIOMotorCollection, stats: AsyncIOMotorCollection, bucket: tuple[str, str, int, int]
+):
+    """Recompute the price statistics of a bucket from every price in it
+
+    Percentiles need the whole price list, so this reads the bucket's prices, up to
+    VALUATION_REFRESH_MAX_CARS of them, from the brand_make_year_km_price index alone (a covered
+    query, no document is fetched). Bigger buckets are left to the next full rebuild, one car more
+    or less hardly moves their percentiles.
+
+    The statistics are saved only over older ones: a refresh that read the prices before another
+    one saved its own leaves the bucket to it.
+    """
+    max_cars = Settings.VALUATION_REFRESH_MAX_CARS
+    refreshed_at = datetime.now(timezone.utc)
+    try:
+        cursor = cars.find(
+            bucket_query(*bucket), {"_id": 0, "price": 1}, collation=BUCKET_COLLATION
+        ).limit(max_cars + 1)
+        prices = sorted([document["price"] async for document in cursor])
+        if len(prices) > max_cars:
+            logger.debug("Price statistics of %s are left to the next rebuild", bucket_id(*bucket))
+            return
+        # an emptied bucket keeps its refresh time, so a slower refresh cannot bring it back
+        summary = summarize(prices) if prices else {"count": 0}
+        document = stats_document(*bucket, summary, refreshed_at)
+        await stats.replace_one(
+            {"_id": document["_id"], "refreshed_at": {"$lt": refreshed_at}}, document, upsert=True
+        )
+    except DuplicateKeyError:
+        logger.debug("Price statistics of %s were refreshed since", bucket_id(*bucket))
+    except PyMongoError as error:
+        logger.warning(
+            "Could not refresh the price statistics of %s: %s", bucket_id(*bucket), error
+        )
+
+
+async def refresh_buckets(
+    cars: AsyncIOMotorCollection, stats: AsyncIOMotorCollection, written: Iterable[dict]
+):
+    """Refresh every bucket the written cars (pre-images included) belong to, once each"""
+    buckets = {bucket_id(*car_bucket(car)): car_bucket(car) for car in written}
+    for key in sorted(buckets):
+        await refresh_bucket(cars, stats, buckets[key])
+
+
+async def save_stats(stats: AsyncIOMotorCollection, documents: list[dict], refreshed_at):
+    for chunk in chunked(documents, Settings.BULK_CHUNK_SIZE):
+        try:
+            await stats.bulk_write(
+                [
+                    ReplaceOne(
+                        {"_id": doc["_id"], "refreshed_at": {"$lt": refreshed_at}}, doc, upsert=True
+                    )
+                    for doc in chunk
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as write_error:
+            # duplicate keys are buckets refreshed after this rebuild read them, left as they are
+            if any(err["code"] != DUPLICATE_KEY for err in write_error.details["writeErrors"]):
+                raise
+    # buckets without any car left
+    await stats.delete_many({"refreshed_at": {"$lt": refreshed_at}})
+
+
+async def rebuild_price_stats(cars: AsyncIOMotorCollection, stats: AsyncIOMotorCollection) -> int:
+    """Full recompute with a server side $group, one price list per bucket"""
+    refreshed_at = datetime.now(timezone.utc)
+    band_of = {
+        field: {"$subtract": [f"${field}", {"$mod": [f"${field}", size]}]}
+        for field, size in (
+            ("year", Settings.VALUATION_YEAR_BAND),
+            ("km", Settings.VALUATION_KM_BAND),
+        )
+    }
+    pipeline = [
+        {
+            "$group": {
+                "_id": {
+                    "brand": "$brand",
+                    "make": "$make",
+                    "year_band": band_of["year"],
+                    "km_band": band_of["km"],
+                },
+                "prices": {"$push": "$price"},
+            }
+        }
+    ]
+    # spellings of a brand and make that differ in case only share their bucket
+    merged: dict[str, tuple[tuple, list]] = {}
+    async for bucket in cars.aggregate(pipeline, allowDiskUse=True):
+        key = (
+            bucket["_id"]["brand"],
+            str(bucket["_id"]["make"]),
+            int(bucket["_id"]["year_band"]),
+            int(bucket["_id"]["km_band"]),
+        )
+        _, prices = merged.setdefault(bucket_id(*key), (key, []))
+        prices.extend(bucket["prices"])
+    documents = [
+        stats_document(*key, summarize(sorted(prices)), refreshed_at)
+        for key, prices in merged.values()
+    ]
+    await save_stats(stats, documents, refreshed_at)
+    return len(documents)
+
+
+async def rebuild_price_stats_numpy(
+    cars: AsyncIOMotorCollection, stats: AsyncIOMotorCollection
+) -> int:
+    """Full recompute on this machine: every percentile of every bucket in a few array passes"""
+    # optional and slow to import, only this offline path loads it
+    import numpy
+
+    refreshed_at = datetime.now(timezone.utc)
+    names: dict[tuple, int] = {}
+    brand_make: dict[int, tuple] = {}
+    rows = []
+    cursor = cars.find({}, {"_id": 0, "price": 1, **BUCKET_FIELDS})
+    cursor.batch_size(Settings.EXPORT_BATCH_SIZE)
+    async for car in cursor:
+        name = names.setdefault(bucket_name(car["brand"], car["make"]), len(names))
+        brand_make.setdefault(name, (car["brand"], str(car["make"])))
+        rows.append((name, car["year"], car["km"], car["price"]))
+    if not rows:
+        await save_stats(stats, [], refreshed_at)
+        return 0
+
+    name, year, km, price = numpy.array(rows, dtype=numpy.int64).T
+    year_band = year - year % Settings.VALUATION_YEAR_BAND
+    km_band = km - km % Settings.VALUATION_KM_BAND
+    keys, bucket = numpy.unique(
+        numpy.stack([name, year_band, km_band], axis=1), axis=0, return_inverse=True
+    )
+    bucket = bucket.reshape(-1)
+
+    # prices sorted within each bucket, buckets laid out one after another
+    order = numpy.lexsort((price, bucket))
+    sorted_prices = price[order]
+    counts = numpy.bincount(bucket)
+    starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+    sums = numpy.bincount(bucket, weights=price)
+
+    values = {}
+    for percentile in PERCENTILES:
+        position = (counts - 1) * percentile / 100
+        lower = numpy.floor(position).astype(numpy.int64)
+        upper = numpy.minimum(lower + 1, counts - 1)
+        low, high = sorted_prices[starts + lower], sorted_prices[starts + upper]
+        values[f"p{percentile}"] = numpy.rint(low + (high - low) * (position - lower))
+
+    documents = []
+    for index, (name_code, year_band_value, km_band_value) in enumerate(keys.tolist()):
+        summary = {
+            "count": int(counts[index]),
+            "mean": round(float(sums[index]) / int(counts[index])),
+            **{key: int(column[index]) for key, column in values.items()},
+        }
+        documents.append(
+            stats_document(
+                *brand_make[name_code], year_band_value, km_band_value, summary, refreshed_at
+            )
+        )
+    await save_stats(stats, documents, refreshed_at)
+    return len(documents)
+
+
+async def _run(use_numpy: bool):
+    from app.database import close_mongodb_connection, connect_to_mongodb
+
+    database = connect_to_mongodb()[Settings.DB_NAME]
+    cars, stats = database[Settings.COLLECTION_NAME], database[Settings.VALUATION_COLLECTION]
+    rebuild = rebuild_price_stats_numpy if use_numpy else rebuild_price_stats
+    try:
+        print("Price statistics buckets:", await rebuild(cars, stats))
+    finally:
+        close_mongodb_connection()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Rebuild the price statistics behind GET /cars/valuation, e.g. from cron"
+    )
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--numpy", action="store_true", help="compute the buckets locally")
+    arguments = parser.parse_args()
+    if arguments.numpy and importlib.util.find_spec("numpy") is None:
+        parser.error("--numpy needs the numpy package")
+    asyncio.run(_run(arguments.numpy))
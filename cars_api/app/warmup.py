@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorCollection
+from pymongo.errors import PyMongoError
+
+from app.indexes import ensure_indexes
+from app.models import CarModelBase, CarModelFull
+
+logger = logging.getLogger(__name__)
+
+# Goes through every car field validator, including the int make conversion
+WARM_UP_CAR = {
+    "_id": "65d804debfef2fc45309aeb8",
+    "brand": "Fiat",
+    "make": 500,
+    "year": 2015,
+    "cm3": 1248,
+    "km": 115000,
+    "price": 7300,
+}
+
+
+def warm_up_models(app: FastAPI):
+    """Run the car validators and serializers and build the OpenAPI schema once, so the first
+    requests do not pay for them"""
+    for model in (CarModelBase, CarModelFull):
+        model(**WARM_UP_CAR).model_dump(mode="json", by_alias=True)
+    app.openapi()
+
+
+async def ping_database(client: AsyncIOMotorClient) -> bool:
+    """Server discovery and a first pooled connection, up to DB_SERVER_SELECTION_TIMEOUT_MS"""
+    try:
+        await client.admin.command("ping")
+    except PyMongoError as error:
+        logger.warning("MongoDB is not reachable yet: %s", error)
+        return False
+    return True
+
+
+async def prepare_database(
+    client: AsyncIOMotorClient, indexed: AsyncIOMotorCollection | None
+) -> bool:
+    """Ping MongoDB, and once it answers ensure the indexes of the indexed collection"""
+    if not await ping_database(client):
+        return False
+    if indexed is not None:
+        try:
+            await ensure_indexes(indexed)
+        except PyMongoError as error:
+            logger.warning("Could not ensure the cars collection indexes: %s", error)
+    return True
+
+
+async def wait_for_database(
+    app: FastAPI,
+    client: AsyncIOMotorClient,
+    retry_interval: float,
+    indexed: AsyncIOMotorCollection | None = None,
+):
+    while not await prepare_database(client, indexed):
+        await asyncio.sleep(retry_interval)
+    app.state.ready = True
+    logger.info("MongoDB is reachable, ready to serve")
+
+
+async def warm_up(
+    app: FastAPI,
+    client: AsyncIOMotorClient,
+    retry_interval: float,
+    indexed: AsyncIOMotorCollection | None = None,
+) -> asyncio.Task | None:
+    """Warm-up phase of the app lifespan, app.state.ready is set once it is done
+
+    When MongoDB does not answer yet the app starts anyway, not ready, and the returned task keeps
+    pinging it every retry_interval seconds. The indexes of indexed are ensured after the first
+    ping MongoDB answers, so an unreachable server is only waited for once per attempt.
+    """
+    started = time.perf_counter()
+    warm_up_models(app)
+    if not await prepare_database(client, indexed):
+        return asyncio.create_task(wait_for_database(app, client, retry_interval, indexed))
+    app.state.ready = True
+    logger.info("Warmed up in %.3fs", time.perf_counter() - started)
+    return None
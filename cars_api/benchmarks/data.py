@@ -0,0 +1,44 @@
+import random
+
+from bson import ObjectId
+
+BRANDS = {
+    "Fiat": ["Doblo", "Punto", "Panda", "Tipo"],
+    "Citroen": ["C3", "C4", "Berlingo"],
+    "Volkswagen": ["Golf", "Polo", "Passat", "Touran"],
+    "Mercedes-Benz": ["A 180", "C 220", "E 300"],
+    "Renault": ["Clio", "Megane", "Kangoo"],
+    "Peugeot": ["208", "308", "Partner"],
+}
+
+
+def synthetic_cars(count: int, seed: int = 42) -> list[dict]:
+    """Cars shaped like the test fixtures, extra listing attributes included"""
+    rng = random.Random(seed)
+    cars = []
+    for _ in range(count):
+        brand = rng.choice(list(BRANDS))
+        cars.append(
+            {
+                "_id": ObjectId(),
+                "brand": brand,
+                "make": rng.choice(BRANDS[brand]),
+                "year": rng.randint(1995, 2024),
+                "price": rng.randint(1000, 100000),
+                "km": rng.randint(0, 400000),
+                "gearbox": rng.choice(["M", "A"]),
+                "doors": rng.choice(["2/3", "4/5"]),
+                "imported": str(rng.randint(0, 1)),
+                "kW": str(rng.randint(40, 250)),
+                "cm3": float(rng.randint(1000, 4000)),
+                "fuel": rng.choice(["diesel", "petrol", "hybrid"]),
+                "registered": str(rng.randint(0, 1)),
+                "color": rng.choice(["WH", "BL", "RD", "GR"]),
+                "aircon": str(rng.randint(0, 4)),
+                "damage": "0",
+                "car_type": rng.choice(["PU", "SDN", "HB", "SUV"]),
+                "standard": str(rng.randint(3, 6)),
+                "drive": rng.choice(["F", "R", "4"]),
+            }
+        )
+    return cars
@@ -0,0 +1,216 @@
+"""In-process load test of the cars API against a local MongoDB stand-in
+
+Seeds synthetic cars, then drives list_all, get_one_car and add_new_car concurrently through
+an ASGI client and reports latency percentiles and throughput per scenario.
+
+Usage:
+    python -m benchmarks.load --cars 2000 --requests 1000 --concurrency 16 --save
+    python -m benchmarks.load --compare   # exit code 1 on regression against the baseline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+for name in ("DB_URL", "DB_NAME", "COLLECTION_NAME"):
+    os.environ.setdefault(name, "benchmarks")
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from app.cache import NullCacheBackend, ResponseCache, response_cache  # noqa: E402
+from app.config import Settings  # noqa: E402
+from app.database import mongodb_client  # noqa: E402
+from app.main import app  # noqa: E402
+from benchmarks.data import BRANDS, synthetic_cars  # noqa: E402
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+
+
+class CollectionCache:
+    """Database proxy returning one collection object per name
+
+    mongomock_motor patches the collection internals again on every lookup, which stacks
+    wrappers until the recursion limit is hit after a few thousand requests.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = self.database[name]
+        return self.collections[name]
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+
+def scenarios(car_ids: list[str], rng: random.Random) -> dict:
+    def list_all():
+        params = {"max_price": 100000, "page": rng.randint(1, 5)}
+        if rng.random() < 0.5:
+            params["brand"] = rng.choice(list(BRANDS))
+        return "GET", "/cars/", {"params": params}
+
+    def get_one_car():
+        return "GET", f"/cars/{rng.choice(car_ids)}", {}
+
+    def add_new_car():
+        car = synthetic_cars(1, seed=rng.randint(0, 2**32))[0]
+        new_car = {key: car[key] for key in ("brand", "make", "year", "km", "price")}
+        return "POST", "/cars/", {"json": {**new_car, "cm3": int(car["cm3"])}}
+
+    return {"list_all": list_all, "get_one_car": get_one_car, "add_new_car": add_new_car}
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+    }
+
+
+async def run_scenario(client: httpx.AsyncClient, build_request, requests: int, concurrency: int):
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            method, url, kwargs = build_request()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def run_benchmark(
+    cars: int,
+    requests: int,
+    concurrency: int,
+    mongodb_url: str | None = None,
+    use_cache: bool = True,
+    seed: int = 42,
+) -> dict:
+    if mongodb_url:
+        motor_client = AsyncIOMotorClient(mongodb_url)
+        database = motor_client["cars_api_benchmarks"]
+    else:
+        motor_client = None
+        database = CollectionCache(AsyncMongoMockClient()["benchmarks"])
+
+    collection = database[Settings.COLLECTION_NAME]
+    await collection.delete_many({})
+    seeded = synthetic_cars(cars, seed=seed)
+    await collection.insert_many(seeded)
+    car_ids = [str(car["_id"]) for car in seeded]
+
+    async def benchmark_database():
+        yield database
+
+    app.dependency_overrides[mongodb_client] = benchmark_database
+    if not use_cache:
+        app.dependency_overrides[response_cache] = lambda: ResponseCache(NullCacheBackend(), 0)
+
+    # every benchmark request comes from the same client, measure the API rather than its limits
+    rate_limits, Settings.RATE_LIMITS = Settings.RATE_LIMITS, {}
+
+    rng = random.Random(seed)
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmarks") as client:
+            for name, build_request in scenarios(car_ids, rng).items():
+                results[name] = await run_scenario(client, build_request, requests, concurrency)
+    finally:
+        Settings.RATE_LIMITS = rate_limits
+        app.dependency_overrides.pop(mongodb_client, None)
+        app.dependency_overrides.pop(response_cache, None)
+        if motor_client:
+            await collection.drop()
+            motor_client.close()
+
+    return {
+        "meta": {
+            "cars": cars,
+            "requests": requests,
+            "concurrency": concurrency,
+            "backend": "mongodb" if mongodb_url else "mongomock",
+            "cache": use_cache,
+        },
+        "results": results,
+    }
+
+
+def regressions(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    found = []
+    for name, result in report["results"].items():
+        reference = baseline["results"].get(name)
+        if not reference:
+            continue
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance):
+            found.append(f"{name}: p95 {result['p95_ms']}ms > baseline {reference['p95_ms']}ms")
+        if result["rps"] < reference["rps"] * (1 - tolerance):
+            found.append(f"{name}: {result['rps']} req/s < baseline {reference['rps']} req/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cars", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mongodb-url", help="benchmark a real MongoDB instead of mongomock")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the response cache")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="fail on regression vs baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    report = asyncio.run(
+        run_benchmark(
+            args.cars, args.requests, args.concurrency, args.mongodb_url, not args.no_cache
+        )
+    )
+
+    print(f"{'scenario':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in report["results"].items():
+        print(
+            f"{name:<14}{result['rps']:>10}{result['p50_ms']:>10}{result['p95_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['errors']:>8}"
+        )
+
+    if args.save:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+
+    if args.compare:
+        found = regressions(report, json.loads(args.baseline.read_text()), args.tolerance)
+        for regression in found:
+            print("REGRESSION", regression)
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Latency of list_all?q= prefix search against a $regex scan on a large synthetic dataset
+
+Usage:
+    python -m benchmarks.search --mongodb-url mongodb://localhost:27017 --cars 1000000
+    python -m benchmarks.search --cars 20000   # quick run on mongomock, without explain()
+"""
+
+import argparse
+import asyncio
+import re
+import statistics
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.indexes import ensure_indexes
+from app.models import CarModelFull, model_projection
+from app.search import build_search_pipeline, search_tokens, with_search_fields
+from benchmarks.data import synthetic_cars
+
+QUERIES = ["vw golf", "merc", "fiat do", "peugeot 308", "clio", "citroen berlingo"]
+PRICE_FILTER = {"price": {"$gt": 0, "$lt": 100001}}
+
+
+def regex_filter(q: str) -> dict:
+    return {
+        "$and": [
+            {
+                "$or": [
+                    {"brand": {"$regex": re.escape(word), "$options": "i"}},
+                    {"make": {"$regex": re.escape(word), "$options": "i"}},
+                ]
+            }
+            for word in q.split()
+        ],
+        **PRICE_FILTER,
+    }
+
+
+async def seed(collection, count: int, batch_size: int = 10000):
+    await collection.drop()
+    for start in range(0, count, batch_size):
+        batch = synthetic_cars(min(batch_size, count - start), seed=start)
+        await collection.insert_many([with_search_fields(car) for car in batch], ordered=False)
+    await ensure_indexes(collection)
+
+
+async def timed(run, rounds: int) -> float:
+    latencies = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        await run()
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000
+
+
+async def docs_examined(collection, query: dict) -> int | None:
+    try:
+        explain = await collection.find(query).explain()
+    except (AttributeError, NotImplementedError):
+        return None
+    return explain["executionStats"]["totalDocsExamined"]
+
+
+async def main(args):
+    if args.mongodb_url:
+        client = AsyncIOMotorClient(args.mongodb_url)
+        collection = client["cars_api_benchmarks"]["cars_search"]
+    else:
+        client = None
+        collection = AsyncMongoMockClient()["benchmarks"]["cars_search"]
+
+    print(f"Seeding {args.cars} cars...")
+    await seed(collection, args.cars)
+    projection = model_projection(CarModelFull)
+
+    print(f"{'query':<18}{'q= ms':>10}{'$regex ms':>12}{'q= examined':>14}{'$regex examined':>17}")
+    for q in QUERIES:
+        tokens = search_tokens(q)
+        pipeline = build_search_pipeline(PRICE_FILTER, tokens, projection, 0, 25)
+
+        async def search():
+            return await collection.aggregate(pipeline).to_list(None)
+
+        async def regex_scan():
+            return await collection.find(regex_filter(q), projection).limit(25).to_list(None)
+
+        search_ms = await timed(search, args.rounds)
+        regex_ms = await timed(regex_scan, args.rounds)
+        search_examined = await docs_examined(
+            collection, {**PRICE_FILTER, "search_prefixes": {"$all": tokens}}
+        )
+        regex_examined = await docs_examined(collection, regex_filter(q))
+        print(
+            f"{q:<18}{search_ms:>10.2f}{regex_ms:>12.2f}"
+            f"{str(search_examined or '-'):>14}{str(regex_examined or '-'):>17}"
+        )
+
+    if client:
+        await collection.drop()
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cars", type=int, default=1_000_000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--mongodb-url", help="benchmark a real MongoDB instead of mongomock")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,45 @@
+"""Rows per second of the list response serialization, before and after the fast path
+
+Usage: python -m benchmarks.serialization [rows]
+"""
+
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.models import CarModelFull, model_projection
+from app.serialization import FastJSONResponse, compile_row_converter, orjson
+from benchmarks.data import synthetic_cars
+
+
+def model_path(cars: list[dict]) -> bytes:
+    return JSONResponse(content=jsonable_encoder([CarModelFull(**car) for car in cars])).body
+
+
+def fast_path(cars: list[dict]) -> bytes:
+    convert = compile_row_converter(CarModelFull)
+    return FastJSONResponse(content=[convert(car) for car in cars]).body
+
+
+def rows_per_second(serialize, cars: list[dict], rounds: int = 5) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        serialize(cars)
+        best = min(best, time.perf_counter() - started)
+    return len(cars) / best
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 25000
+    projection = model_projection(CarModelFull)
+    cars = [{key: car[key] for key in projection} for car in synthetic_cars(count)]
+
+    print(f"{count} rows, orjson {'enabled' if orjson else 'not installed'}")
+    before = rows_per_second(model_path, cars)
+    after = rows_per_second(fast_path, cars)
+    print(f"CarModelFull + jsonable_encoder + JSONResponse: {before:>12,.0f} rows/s")
+    print(f"compiled row converter + FastJSONResponse:      {after:>12,.0f} rows/s")
+    print(f"speedup: x{after / before:.1f}")
@@ -0,0 +1,125 @@
+"""Latency and round trips of car writes that answer with the stored car
+
+Usage:
+    python -m benchmarks.writes --mongodb-url mongodb://localhost:27017
+    python -m benchmarks.writes   # mongomock: round trips only, it has no network and its
+                                  # find_one_and_update scans the collection twice
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, monitoring
+
+from app.changes import DETAILS_PROJECTION
+from app.conditional import versioned_insert, versioned_update
+from app.search import with_search_fields
+from benchmarks.data import synthetic_cars
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def wrap(self, collection):
+        """Count the calls made on a collection that has no command monitoring"""
+        counter = self
+
+        class CountedCollection:
+            def __getattr__(self, name):
+                method = getattr(collection, name)
+
+                def counted(*args, **kwargs):
+                    counter.count += 1
+                    return method(*args, **kwargs)
+
+                return counted
+
+        return CountedCollection()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def insert_then_read(collection, car: dict) -> dict:
+    doc = await collection.insert_one(versioned_insert(with_search_fields(car)))
+    return await collection.find_one({"_id": doc.inserted_id}, DETAILS_PROJECTION)
+
+
+async def insert_only(collection, car: dict) -> dict:
+    new_car = versioned_insert(with_search_fields(car))
+    doc = await collection.insert_one(new_car)
+    return {**new_car, "_id": doc.inserted_id}
+
+
+async def update_then_read(collection, car: dict) -> dict:
+    await collection.update_one({"_id": car["_id"]}, versioned_update({"price": car["price"] + 1}))
+    return await collection.find_one({"_id": car["_id"]}, DETAILS_PROJECTION)
+
+
+async def find_and_update(collection, car: dict) -> dict:
+    return await collection.find_one_and_update(
+        {"_id": car["_id"]},
+        versioned_update({"price": car["price"] + 1}),
+        projection=DETAILS_PROJECTION,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def measure(write, collection, cars: list[dict], counter: CommandCounter):
+    latencies = []
+    commands = counter.count
+    for car in cars:
+        started = time.perf_counter()
+        await write(collection, car)
+        latencies.append(time.perf_counter() - started)
+    return statistics.median(latencies) * 1000, (counter.count - commands) / len(cars)
+
+
+async def main(args):
+    counter = CommandCounter()
+    if args.mongodb_url:
+        client = AsyncIOMotorClient(args.mongodb_url, event_listeners=[counter])
+        collection = client["cars_api_benchmarks"]["cars_writes"]
+    else:
+        client = None
+        collection = counter.wrap(AsyncMongoMockClient()["benchmarks"]["cars_writes"])
+    await collection.drop()
+
+    # new cars, the _id comes from the insert
+    cars = [
+        {key: value for key, value in car.items() if key != "_id"}
+        for car in synthetic_cars(args.writes)
+    ]
+    existing = [await insert_only(collection, car) for car in synthetic_cars(args.writes, seed=1)]
+
+    print(f"{'write':<34}{'median ms':>10}{'round trips':>13}")
+    for name, write, rows in [
+        ("insert_one + find_one", insert_then_read, cars),
+        ("insert_one", insert_only, cars),
+        ("update_one + find_one", update_then_read, existing),
+        ("find_one_and_update", find_and_update, existing),
+    ]:
+        median_ms, round_trips = await measure(write, collection, rows, counter)
+        print(f"{name:<34}{median_ms:>10.3f}{round_trips:>13.1f}")
+
+    await collection.drop()
+    if client:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--mongodb-url", help="benchmark a real MongoDB instead of mongomock")
+    asyncio.run(main(parser.parse_args()))
@@ -2,8 +2,9 @@
 set -e
 set -u
 
-if [ -n "${MODE}" ] && [ "${MODE}" != "dev" ]; then
-  uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
+# exec so the server is PID 1 and receives SIGTERM to drain in-flight requests
+if [ "${MODE:-}" = "dev" ]; then
+  exec python -m app.server --dev
 else
-  uvicorn app.main:app --host 0.0.0.0 --port 8000
+  exec python -m app.server
 fi
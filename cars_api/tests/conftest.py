@@ -1,7 +1,13 @@
 import pytest
+import pytest_asyncio
+from bson import ObjectId
 from fastapi.testclient import TestClient
 from mongomock_motor import AsyncMongoMockClient
 
+from app.cache import get_cache
+from app.config import Settings
+from app.database import mongodb_client
+from app.limits import get_rate_limiter
 from app.main import app
 
 
@@ -10,7 +16,104 @@ async def mongodb_client_mock():
     yield mocked_client
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def clear_response_cache():
+    await get_cache().clear()
+    yield
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def clear_rate_limits():
+    await get_rate_limiter().clear()
+    yield
+
+
 @pytest.fixture(scope="session")
 def test_client():
     tclient = TestClient(app)
     yield tclient
+
+
+@pytest.fixture
+def test_data():
+    yield [
+        {
+            "_id": "65d804debfef2fc45309aeb8",
+            "brand": "Fiat",
+            "make": "Doblo",
+            "year": 2015,
+            "price": 7300,
+            "km": 115000,
+            "gearbox": "M",
+            "doors": "4/5",
+            "imported": "0",
+            "kW": "55",
+            "cm3": 1248.0,
+            "fuel": "diesel",
+            "registered": "1",
+            "color": "WH",
+            "aircon": "2",
+            "damage": "0",
+            "car_type": "PU",
+            "standard": "5",
+            "drive": "F",
+        },
+        {
+            "_id": "65d8060ca6f1b4a3fab582a9",
+            "brand": "Fiat",
+            "make": "Doblo",
+            "year": 2015,
+            "price": 5990,
+            "km": 71000,
+            "gearbox": "M",
+            "doors": "2/3",
+            "imported": "0",
+            "kW": "66",
+            "cm3": 1248.0,
+            "fuel": "diesel",
+            "registered": "1",
+            "color": "WH",
+            "aircon": "2",
+            "damage": "0",
+            "car_type": "PU",
+            "standard": "5",
+            "drive": "F",
+        },
+        {
+            "_id": "65d8061ea6f1b4a3fab582aa",
+            "brand": "Citroen",
+            "make": "C3",
+            "year": 2004,
+            "price": 2050,
+            "km": 203415,
+            "gearbox": "M",
+            "doors": "4/5",
+            "imported": "0",
+            "kW": "50",
+            "cm3": 1398.0,
+            "fuel": "diesel",
+            "registered": "0",
+            "color": "BL",
+            "aircon": "4",
+            "damage": "0",
+            "car_type": "SDN",
+            "standard": "3",
+            "drive": "F",
+        },
+    ]
+
+
+@pytest_asyncio.fixture
+async def mongodb_seeded(test_client, test_data):
+    """Stateful in-memory database seeded with the test cars, shared by every request"""
+    database = AsyncMongoMockClient()["tests"]
+    await database[Settings.COLLECTION_NAME].insert_many(
+        [{**car, "_id": ObjectId(car["_id"])} for car in test_data]
+    )
+
+    async def seeded_client():
+        yield database
+
+    test_client.app.dependency_overrides[mongodb_client] = seeded_client
+    yield database
+    test_client.app.dependency_overrides.pop(mongodb_client, None)
@@ -1,7 +1,25 @@
-from app.database import mongodb_client
+from app.config import Settings
+from app.database import close_mongodb_connection, connect_to_mongodb, mongodb_client
 
 
 # mark this test as E2E test with pytest
-def test_mongodb_client():
-    client = mongodb_client()
+def test_mongodb_client(mocker):
+    client = mongodb_client(mocker.Mock())
     assert client is not None
+
+
+def test_mongodb_client_is_shared(mocker):
+    mocked_motor = mocker.patch("app.database.AsyncIOMotorClient")
+    close_mongodb_connection()
+
+    first = connect_to_mongodb()
+    second = connect_to_mongodb()
+    assert first is second
+    mocked_motor.assert_called_once()
+    assert mocked_motor.call_args.kwargs["maxPoolSize"] == Settings.DB_MAX_POOL_SIZE
+
+    close_mongodb_connection()
+    first.close.assert_called_once()
+    connect_to_mongodb()
+    assert mocked_motor.call_count == 2
+    close_mongodb_connection()
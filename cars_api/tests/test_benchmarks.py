@@ -0,0 +1,18 @@
+import pytest
+
+from benchmarks.load import regressions, run_benchmark
+
+
+@pytest.mark.asyncio
+async def test_load_benchmark_smoke():
+    report = await run_benchmark(cars=50, requests=20, concurrency=4)
+
+    assert set(report["results"]) == {"list_all", "get_one_car", "add_new_car"}
+    for result in report["results"].values():
+        assert result["requests"] == 20
+        assert result["errors"] == 0
+        assert result["p50_ms"] <= result["p95_ms"] <= result["p99_ms"]
+
+    assert regressions(report, report, tolerance=0.2) == []
+    slower = {"results": {"list_all": {**report["results"]["list_all"], "p95_ms": 0}}}
+    assert regressions(report, slower, tolerance=0.2)
@@ -0,0 +1,114 @@
+import fnmatch
+import json
+
+import pytest
+
+from app.cache import CachedResponse, InMemoryCacheBackend, RedisCacheBackend, ResponseCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def scan_iter(self, match):
+        for key in list(self.data):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+
+@pytest.mark.asyncio
+async def test_in_memory_backend_lru_and_ttl(mocker):
+    backend = InMemoryCacheBackend(max_entries=2)
+    await backend.set("a", CachedResponse(b"1"), ttl=10)
+    await backend.set("b", CachedResponse(b"2"), ttl=10)
+    assert await backend.get("a") == CachedResponse(b"1")
+
+    # "b" is the least recently used entry
+    await backend.set("c", CachedResponse(b"3"), ttl=10)
+    assert await backend.get("b") is None
+    assert await backend.get("a") is not None
+
+    mocker.patch("app.cache.time.monotonic", return_value=10**9)
+    assert await backend.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_invalidation():
+    cache = ResponseCache(RedisCacheBackend(client=FakeRedis()), ttl=10)
+    list_key = cache.list_key(page=1, brand="Fiat")
+    car_key = cache.car_key("65d804debfef2fc45309aeb8")
+    await cache.set(list_key, CachedResponse(b"[]", {"X-Next-Cursor": "abc"}))
+    await cache.set(car_key, CachedResponse(b"{}"))
+    await cache.set(cache.car_key("other"), CachedResponse(b"{}"))
+
+    assert await cache.get(list_key) == CachedResponse(b"[]", {"X-Next-Cursor": "abc"})
+    assert await cache.get("cars:missing") is None
+    assert cache.stats_dict()["hits"] == 1
+    assert cache.stats_dict()["misses"] == 1
+
+    await cache.invalidate_cars("65d804debfef2fc45309aeb8")
+    assert await cache.get(list_key) is None
+    assert await cache.get(car_key) is None
+    assert await cache.get(cache.car_key("other")) is not None
+
+
+@pytest.mark.asyncio
+async def test_listings_are_dropped_once_per_burst(mocker):
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl=10)
+    delete_prefix = mocker.spy(cache.backend, "delete_prefix")
+    await cache.set(cache.list_key(page=1), CachedResponse(b"[]"))
+
+    # a burst of change events, then a write waiting for the listings to be gone
+    for car_id in range(20):
+        await cache.invalidate_cars(car_id, wait_for_listings=False)
+    await cache.invalidate_cars("65d804debfef2fc45309aeb8")
+    assert await cache.get(cache.list_key(page=1)) is None
+    assert delete_prefix.call_count == 1
+
+
+def test_list_key_is_normalized():
+    assert ResponseCache.list_key(brand="Fiat", page=1, cursor=None) == ResponseCache.list_key(
+        page=1, brand="Fiat"
+    )
+
+
+@pytest.mark.asyncio
+async def test_car_details_are_cached(test_client, mongodb_seeded, test_data):
+    car_id = test_data[0]["_id"]
+
+    response = test_client.get(f"/cars/{car_id}")
+    assert response.status_code == 200
+    cached_response = test_client.get(f"/cars/{car_id}")
+    assert cached_response.json() == response.json()
+
+    stats = test_client.get("/cache/stats").json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+@pytest.mark.asyncio
+async def test_writes_invalidate_cached_responses(test_client, mongodb_seeded, test_data):
+    car_id = test_data[0]["_id"]
+    assert test_client.get(f"/cars/{car_id}").json()["price"] == 7300
+    assert test_client.get("/cars").json()[-1]["price"] == 7300
+
+    update = {k: v for k, v in test_data[0].items() if k in {"_id", "brand", "make", "year", "km"}}
+    response = test_client.put("/cars/", data=json.dumps({**update, "cm3": 1248, "price": 9000}))
+    assert response.status_code == 200
+
+    assert test_client.get(f"/cars/{car_id}").json()["price"] == 9000
+    assert test_client.get("/cars").json()[-1]["price"] == 9000
+
+    response = test_client.delete("/cars/", params={"car_id": car_id})
+    assert response.status_code == 200
+    assert test_client.get(f"/cars/{car_id}").status_code == 404
@@ -2,82 +2,15 @@ import json
 from unittest import mock
 
 import pytest
+from bson import ObjectId
 from dotmap import DotMap
 
+from app.config import Settings
 from app.database import mongodb_client
 from app.models import CarModelBase
 from tests.conftest import mongodb_client_mock
 
 
-@pytest.fixture
-def test_data():
-    yield [
-        {
-            "_id": "65d804debfef2fc45309aeb8",
-            "brand": "Fiat",
-            "make": "Doblo",
-            "year": 2015,
-            "price": 7300,
-            "km": 115000,
-            "gearbox": "M",
-            "doors": "4/5",
-            "imported": "0",
-            "kW": "55",
-            "cm3": 1248.0,
-            "fuel": "diesel",
-            "registered": "1",
-            "color": "WH",
-            "aircon": "2",
-            "damage": "0",
-            "car_type": "PU",
-            "standard": "5",
-            "drive": "F",
-        },
-        {
-            "_id": "65d8060ca6f1b4a3fab582a9",
-            "brand": "Fiat",
-            "make": "Doblo",
-            "year": 2015,
-            "price": 5990,
-            "km": 71000,
-            "gearbox": "M",
-            "doors": "2/3",
-            "imported": "0",
-            "kW": "66",
-            "cm3": 1248.0,
-            "fuel": "diesel",
-            "registered": "1",
-            "color": "WH",
-            "aircon": "2",
-            "damage": "0",
-            "car_type": "PU",
-            "standard": "5",
-            "drive": "F",
-        },
-        {
-            "_id": "65d8061ea6f1b4a3fab582aa",
-            "brand": "Citroen",
-            "make": "C3",
-            "year": 2004,
-            "price": 2050,
-            "km": 203415,
-            "gearbox": "M",
-            "doors": "4/5",
-            "imported": "0",
-            "kW": "50",
-            "cm3": 1398.0,
-            "fuel": "diesel",
-            "registered": "0",
-            "color": "BL",
-            "aircon": "4",
-            "damage": "0",
-            "car_type": "SDN",
-            "standard": "3",
-            "drive": "F",
-        },
-    ]
-
-
 @pytest.mark.asyncio
 async def test_list_all_cars_success(test_client, test_data):
     class AsyncMockIterator:
@@ -99,7 +32,7 @@ async def test_list_all_cars_success(test_client, test_data):
     mock_cursor.limit = mock.MagicMock(return_value=AsyncMockIterator(test_data))
 
     with mock.patch("tests.conftest.AsyncMongoMockClient") as mock_client:
-        mock_client.return_value.__getitem__.return_value.__getitem__.return_value.find.return_value.skip.return_value = (
+        mock_client.return_value.__getitem__.return_value.__getitem__.return_value.find.return_value.sort.return_value.skip.return_value = (
             mock_cursor
         )
 
@@ -189,7 +122,8 @@ async def test_add_new_car_success(test_client, test_data):
     mocked_collection = mock.AsyncMock()
     insert_one_results = DotMap({"inserted_id": test_data[0].get("_id")})
     mocked_collection.insert_one = mock.AsyncMock(return_value=insert_one_results)
-    mocked_collection.find_one = mock.AsyncMock(return_value=test_data[0])
+    # price statistics refresh, an empty bucket
+    mocked_collection.find = mock.MagicMock()
 
     with mock.patch("tests.conftest.AsyncMongoMockClient") as mock_client:
         mock_client.return_value.__getitem__.return_value.__getitem__.return_value = (
@@ -200,6 +134,10 @@ async def test_add_new_car_success(test_client, test_data):
         )
         response = test_client.post("/cars/", data=post_data)
         assert response.status_code == 201
+        assert response.json() == {**json.loads(post_data), "_id": test_data[0]["_id"]}
+        assert response.headers["ETag"] == f'W/"{test_data[0]["_id"]}-1"'
+        # the response is built from the payload, without reading the car back
+        mocked_collection.find_one.assert_not_called()
 
 
 @pytest.mark.asyncio
@@ -247,7 +185,7 @@ async def test_update_car_no_matched_records(test_client):
     test_client.app.dependency_overrides[mongodb_client] = mongodb_client_mock
 
     mocked_collection = mock.AsyncMock()
-    mocked_collection.update_one.return_value = DotMap({"matched_count": 0})
+    mocked_collection.find_one_and_update.return_value = None
 
     post_data = {
         "_id": "65d804debfef2fc45309aeb8",
@@ -272,7 +210,18 @@ async def test_update_car_success(test_client):
     test_client.app.dependency_overrides[mongodb_client] = mongodb_client_mock
 
     mocked_collection = mock.AsyncMock()
-    mocked_collection.update_one.return_value = DotMap({"matched_count": 1})
+    mocked_collection.find = mock.MagicMock()
+    # the pre-image, the car moves to another price statistics bucket
+    mocked_collection.find_one_and_update.return_value = {
+        "_id": ObjectId("65d804debfef2fc45309aeb8"),
+        "brand": "Fiat",
+        "make": "Doblo",
+        "year": 2012,
+        "cm3": 1248,
+        "km": 115000,
+        "price": 5200,
+        "version": 1,
+    }
 
     post_data = {
         "_id": "65d804debfef2fc45309aeb8",
@@ -289,7 +238,15 @@ async def test_update_car_success(test_client):
         )
         response = test_client.put("/cars/", data=json.dumps(post_data))
         assert response.status_code == 200
-        assert response.json() == {"message": "Success"}
+        assert response.json() == post_data
+        assert response.headers["ETag"] == 'W/"65d804debfef2fc45309aeb8-2"'
+        update = mocked_collection.find_one_and_update.call_args
+        assert update.args[0] == {"_id": ObjectId("65d804debfef2fc45309aeb8")}
+        assert "id" not in update.args[1]["$set"]
+        assert update.args[1]["$set"]["search_terms"] == ["fiat", "doblo"]
+        # both the bucket the car left and the one it joined are refreshed
+        refreshed = [call.args[0]["year"]["$gte"] for call in mocked_collection.find.call_args_list]
+        assert refreshed == [2010, 2015]
 
 
 @pytest.mark.asyncio
@@ -339,7 +296,13 @@ async def test_delete_one_car_success(test_client, test_data):
     test_client.app.dependency_overrides[mongodb_client] = mongodb_client_mock
 
     mocked_collection = mock.AsyncMock()
-    mocked_collection.delete_one.return_value = DotMap({"deleted_count": 1})
+    mocked_collection.find = mock.MagicMock()
+    mocked_collection.find_one_and_delete.return_value = {
+        "brand": "Fiat",
+        "make": "Doblo",
+        "year": 2015,
+        "km": 115000,
+    }
 
     with mock.patch("tests.conftest.AsyncMongoMockClient") as mocked_client:
         mocked_client.return_value.__getitem__.return_value.__getitem__.return_value = (
@@ -349,6 +312,8 @@ async def test_delete_one_car_success(test_client, test_data):
         response = test_client.delete("/cars/", params=data)
         assert response.status_code == 200
         assert response.json() == {"message": "Success"}
+        # the price statistics bucket the car left is refreshed
+        assert mocked_collection.find.call_args.args[0]["year"] == {"$gte": 2015, "$lt": 2020}
 
 
 @pytest.mark.asyncio
@@ -356,7 +321,7 @@ async def test_delete_one_car_not_found(test_client, test_data):
     test_client.app.dependency_overrides[mongodb_client] = mongodb_client_mock
 
     mocked_collection = mock.AsyncMock()
-    mocked_collection.delete_one.return_value = DotMap({"deleted_count": 0})
+    mocked_collection.find_one_and_delete.return_value = None
 
     with mock.patch("tests.conftest.AsyncMongoMockClient") as mocked_client:
         mocked_client.return_value.__getitem__.return_value.__getitem__.return_value = (
@@ -381,3 +346,288 @@ async def test_delete_one_car_bad_id(test_client):
     response = test_client.delete("/cars/", params=data)
     assert response.status_code == 400
     assert response.json() == "Please provide a valid ObjectID as car ID"
+
+
+@pytest.mark.asyncio
+async def test_list_all_cursor_pagination(test_client, mongodb_seeded):
+    response = test_client.get("/cars", params={"page_limit": 2})
+    assert response.status_code == 200
+    assert [car["price"] for car in response.json()] == [2050, 5990]
+
+    next_cursor = response.headers["X-Next-Cursor"]
+    # readable by browser clients
+    response = test_client.get(
+        "/cars", params={"page_limit": 2}, headers={"Origin": "https://cars.example"}
+    )
+    exposed = response.headers["Access-Control-Expose-Headers"].split(", ")
+    assert {"X-Next-Cursor", "X-Total-Count", "ETag"} <= set(exposed)
+
+    response = test_client.get("/cars", params={"page_limit": 2, "cursor": next_cursor})
+    assert response.status_code == 200
+    assert [car["price"] for car in response.json()] == [7300]
+    assert "X-Next-Cursor" not in response.headers
+
+    # offset pagination honours page_limit and matches the keyset pages
+    response = test_client.get("/cars", params={"page_limit": 2, "page": 2})
+    assert [car["price"] for car in response.json()] == [7300]
+
+
+@pytest.mark.asyncio
+async def test_list_all_invalid_cursor(test_client, mongodb_seeded):
+    response = test_client.get("/cars", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json() == "Please provide a valid cursor"
+
+
+@pytest.mark.asyncio
+async def test_list_all_projection(test_client, mongodb_seeded):
+    response = test_client.get("/cars")
+    assert response.status_code == 200
+    assert "gearbox" not in response.json()[0]
+    assert set(response.json()[0]) == {"_id", "brand", "make", "year", "cm3", "km", "price"}
+
+    response = test_client.get("/cars", params={"view": "card"})
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {"_id", "brand", "make", "year", "price"}
+
+    response = test_client.get("/cars", params={"fields": "brand,km", "page_limit": 2})
+    assert response.status_code == 200
+    assert response.json()[0] == {
+        "_id": "65d8061ea6f1b4a3fab582aa",
+        "brand": "Citroen",
+        "km": 203415,
+    }
+    assert "X-Next-Cursor" in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_all_unknown_fields(test_client, mongodb_seeded):
+    response = test_client.get("/cars", params={"fields": "brand,gearbox"})
+    assert response.status_code == 422
+    assert response.json() == "Unknown fields: gearbox"
+
+
+@pytest.mark.asyncio
+async def test_list_all_empty_fields(test_client, mongodb_seeded):
+    for fields in (",", " ", ""):
+        response = test_client.get("/cars", params={"fields": fields})
+        assert response.status_code == 422
+        assert response.json() == "Please provide at least one field"
+
+    # the default listing is not served from a narrower projection
+    response = test_client.get("/cars")
+    assert response.status_code == 200
+    assert "brand" in response.json()[0]
+
+
+@pytest.mark.asyncio
+async def test_add_many_cars(test_client, mongodb_seeded, test_data, mocker):
+    mocker.patch.object(Settings, "BULK_CHUNK_SIZE", 2)
+    new_cars = [
+        {k: v for k, v in car.items() if k in {"brand", "make", "year", "cm3", "km", "price"}}
+        for car in test_data
+    ]
+    new_cars.insert(1, {**new_cars[0], "price": 1})
+
+    response = test_client.post("/cars/bulk", data=json.dumps(new_cars))
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 3
+    assert response.json()["failed"] == 1
+    assert response.json()["results"][1]["status"] == "error"
+    assert response.json()["results"][1]["errors"][0]["loc"] == ["price"]
+    assert await mongodb_seeded[Settings.COLLECTION_NAME].count_documents({}) == 6
+
+    # NDJSON
+    ndjson = "\n".join(json.dumps(car) for car in new_cars[:2])
+    response = test_client.post(
+        "/cars/bulk", content=ndjson, headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()["results"]] == ["inserted", "error"]
+
+
+@pytest.mark.asyncio
+async def test_add_many_cars_bad_body(test_client, mongodb_seeded):
+    response = test_client.post("/cars/bulk", content="{not json")
+    assert response.status_code == 400
+    response = test_client.post("/cars/bulk", data=json.dumps({"brand": "Fiat"}))
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_bulk_cap_checked_while_parsing(test_client, mongodb_seeded, mocker):
+    mocker.patch.object(Settings, "BULK_MAX_ITEMS", 2)
+    # the malformed tail is never reached
+    response = test_client.request("DELETE", "/cars/bulk", content='["a", "b", "c", {not json')
+    assert response.status_code == 406
+    ndjson = '"a"\n"b"\n"c"\n{not json'
+    response = test_client.request(
+        "DELETE", "/cars/bulk", content=ndjson, headers={"content-type": "application/x-ndjson"}
+    )
+    assert response.status_code == 406
+
+
+@pytest.mark.asyncio
+async def test_update_many_cars(test_client, mongodb_seeded, test_data):
+    updates = [
+        {**test_data[0], "price": 6000},
+        {**test_data[1], "_id": "65d804debfef2bcf5309aeb8"},
+        {**test_data[2], "price": 1},
+    ]
+    response = test_client.put("/cars/bulk", data=json.dumps(updates))
+    assert response.status_code == 200
+    assert response.json()["updated"] == 1
+    assert [result["status"] for result in response.json()["results"]] == [
+        "updated",
+        "error",
+        "error",
+    ]
+    assert response.json()["results"][1]["errors"] == ["Car not found"]
+
+    car = await mongodb_seeded[Settings.COLLECTION_NAME].find_one(
+        {"_id": ObjectId(test_data[0]["_id"])}
+    )
+    assert car["price"] == 6000
+
+
+@pytest.mark.asyncio
+async def test_delete_many_cars(test_client, mongodb_seeded, test_data, mocker):
+    # one read for the whole chunk, then one read refreshing the deleted car's price statistics
+    find = mocker.spy(type(mongodb_seeded[Settings.COLLECTION_NAME]), "find")
+    car_ids = [test_data[0]["_id"], "65d804debfef2bcf5309aeb8", "bad-id"]
+    response = test_client.request("DELETE", "/cars/bulk", content=json.dumps(car_ids))
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 1
+    assert response.json()["results"][1]["errors"] == ["Car not found"]
+    assert response.json()["results"][2]["errors"] == ["Please provide a valid ObjectID as car ID"]
+    assert await mongodb_seeded[Settings.COLLECTION_NAME].count_documents({}) == 2
+    pre_read, refresh = [call.args[1] for call in find.call_args_list]
+    assert len(pre_read["_id"]["$in"]) == 2
+    assert refresh["year"] == {"$gte": 2015, "$lt": 2020}
+
+    # deleting again reports what this request removed, nothing
+    response = test_client.request("DELETE", "/cars/bulk", content=json.dumps(car_ids[:1]))
+    assert response.json()["deleted"] == 0
+
+
+@pytest.mark.asyncio
+async def test_export_cars(test_client, mongodb_seeded, mocker):
+    mocker.patch.object(Settings, "EXPORT_BATCH_SIZE", 2)
+
+    response = test_client.get("/cars/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 3
+    assert "gearbox" not in rows[0]
+
+    response = test_client.get("/cars/export", params={"format": "csv", "brand": "Fiat"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0] == "_id,brand,make,year,cm3,km,price"
+    assert len(lines) == 3
+    assert lines[1].startswith("65d804debfef2fc45309aeb8,Fiat,Doblo")
+
+
+@pytest.mark.asyncio
+async def test_list_facets(test_client, mongodb_seeded):
+    response = test_client.get("/cars/facets")
+    assert response.status_code == 200
+    assert response.json() == {
+        "total": 3,
+        "brands": [{"brand": "Fiat", "count": 2}, {"brand": "Citroen", "count": 1}],
+        "years": [{"year": 2015, "count": 2}, {"year": 2004, "count": 1}],
+        "price_bands": [
+            {"min": 0, "max": 5000, "count": 1},
+            {"min": 5000, "max": 10000, "count": 2},
+        ],
+    }
+
+    response = test_client.get("/cars/facets", params={"brand": "Citroen"})
+    assert response.json()["total"] == 1
+    assert response.json()["brands"] == [{"brand": "Citroen", "count": 1}]
+
+
+@pytest.mark.asyncio
+async def test_list_all_total(test_client, mongodb_seeded, mocker):
+    count_documents = mocker.spy(type(mongodb_seeded[Settings.COLLECTION_NAME]), "count_documents")
+    response = test_client.get("/cars", params={"page_limit": 1, "include_total": True})
+    assert response.status_code == 200
+    assert len(response.json()) == 1
+    assert response.headers["X-Total-Count"] == "3"
+
+    # pages after the first, offset or keyset, count every matching car
+    response = test_client.get("/cars", params={"page_limit": 1, "include_total": True, "page": 2})
+    assert [car["price"] for car in response.json()] == [5990]
+    assert response.headers["X-Total-Count"] == "3"
+    next_cursor = response.headers["X-Next-Cursor"]
+    response = test_client.get(
+        "/cars", params={"page_limit": 1, "include_total": True, "cursor": next_cursor}
+    )
+    assert [car["price"] for car in response.json()] == [7300]
+    assert response.headers["X-Total-Count"] == "3"
+    # the pages share the cached total
+    assert count_documents.call_count == 1
+    response = test_client.get(
+        "/cars", params={"include_total": True, "brand": "Citroen", "min_price": 100000}
+    )
+    assert response.json() == []
+    assert response.headers["X-Total-Count"] == "0"
+
+    response = test_client.get("/cars", params={"page_limit": 1})
+    assert "X-Total-Count" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_get_many_cars(test_client, mongodb_seeded, test_data, mocker):
+    find = mocker.spy(type(mongodb_seeded[Settings.COLLECTION_NAME]), "find")
+    car_ids = [test_data[2]["_id"], "65d8061ea6f1b4a3fab58200", "nope", test_data[0]["_id"]]
+
+    response = test_client.post("/cars/batch-get", content=json.dumps(car_ids + [car_ids[0]]))
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["found"], body["failed"]) == (3, 2)
+    assert [result["status"] for result in body["results"]] == [
+        "found",
+        "error",
+        "error",
+        "found",
+        "found",
+    ]
+    assert body["results"][0]["car"]["_id"] == test_data[2]["_id"]
+    assert body["results"][1]["errors"] == ["Car not found"]
+    assert body["results"][2]["errors"] == ["Please provide a valid ObjectID as car ID"]
+    assert body["results"][3]["car"]["brand"] == "Fiat"
+    assert body["results"][4]["car"] == body["results"][0]["car"]
+    # one $in lookup for the three distinct valid IDs
+    assert find.call_count == 1
+    assert len(find.call_args.args[1]["_id"]["$in"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_patch_car(test_client, mongodb_seeded, test_data):
+    car_id = test_data[2]["_id"]
+
+    response = test_client.patch(f"/cars/{car_id}", json={"price": 2500, "km": 210000})
+    assert response.status_code == 200
+    assert response.json()["price"] == 2500
+    assert response.json()["km"] == 210000
+    assert response.json()["make"] == "C3"
+    assert response.headers["ETag"] == f'W/"{car_id}-1"'
+
+    # the search fields follow a brand change
+    response = test_client.patch(f"/cars/{car_id}", json={"brand": "Volkswagen"})
+    assert response.json()["brand"] == "Volkswagen"
+    car = await mongodb_seeded[Settings.COLLECTION_NAME].find_one({"_id": ObjectId(car_id)})
+    assert car["search_terms"] == ["volkswagen", "c3", "vw"]
+    assert test_client.get("/cars", params={"q": "vw c3"}).json()[0]["_id"] == car_id
+
+    response = test_client.patch(f"/cars/{car_id}", json={})
+    assert response.status_code == 400
+
+    response = test_client.patch(f"/cars/{car_id}", json={"price": 1})
+    assert response.status_code == 422
+
+    response = test_client.patch("/cars/65d804debfef2bcf5309aeb8", json={"make": "Punto"})
+    assert response.status_code == 404
@@ -0,0 +1,133 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import AutoReconnect, OperationFailure
+
+from app.cache import CachedResponse, InMemoryCacheBackend, ResponseCache
+from app.changes import (
+    CarFeed,
+    apply_change,
+    car_events,
+    change_streams_supported,
+    poll_changes,
+    watch_changes,
+)
+from app.conditional import versioned_insert
+from app.config import Settings
+
+
+@pytest.mark.asyncio
+async def test_car_events():
+    feed = CarFeed(queue_size=2)
+    events = car_events(feed, heartbeat=0.01)
+    assert await anext(events) == "retry: 3000\n\n"
+    assert await anext(events) == ": keep-alive\n\n"
+
+    # the oldest event is dropped once a subscriber queue is full
+    for price in (1, 2, 3):
+        feed.publish("update", json.dumps({"price": price}).encode())
+    assert await anext(events) == 'event: update\ndata: {"price": 2}\n\n'
+    assert await anext(events) == 'event: update\ndata: {"price": 3}\n\n'
+
+    await events.aclose()
+    assert not feed.subscribers
+
+
+@pytest.mark.asyncio
+async def test_apply_deleted_car_change():
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl=10)
+    feed = CarFeed()
+    car_id = ObjectId()
+    await cache.set(cache.car_key(car_id), CachedResponse(b"{}"))
+    await cache.set(cache.list_key(page=1), CachedResponse(b"[]"))
+
+    with feed.subscribe() as queue:
+        await apply_change(cache, feed, "delete", car_id)
+        assert queue.get_nowait() == ("delete", f'{{"_id":"{car_id}"}}'.encode())
+    assert await cache.get(cache.car_key(car_id)) is None
+    # listings are dropped in the background
+    await asyncio.sleep(0.01)
+    assert await cache.get(cache.list_key(page=1)) is None
+
+
+@pytest.mark.asyncio
+async def test_poll_changes_without_change_streams(mocker, test_data):
+    mocker.patch.object(Settings, "CHANGE_FEED_POLL_INTERVAL", 0.01)
+    collection = AsyncMongoMockClient()["tests"]["cars_changes"]
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl=10)
+    await cache.set(cache.list_key(page=1), CachedResponse(b"[]"))
+    feed = CarFeed()
+
+    with feed.subscribe() as queue:
+        watcher = asyncio.create_task(watch_changes(collection, cache, feed))
+        await asyncio.sleep(0.02)
+        car = {**test_data[0], "_id": ObjectId(test_data[0]["_id"])}
+        await collection.insert_one(versioned_insert(car))
+        event, data = await asyncio.wait_for(queue.get(), 1)
+        watcher.cancel()
+        await asyncio.sleep(0.01)
+
+    assert event == "insert"
+    assert json.loads(data)["_id"] == test_data[0]["_id"]
+    assert "gearbox" not in json.loads(data)
+    # the changed car is warmed, listings are invalidated
+    assert (await cache.get(cache.car_key(car["_id"]))).body == data
+    assert await cache.get(cache.list_key(page=1)) is None
+
+
+@pytest.mark.asyncio
+async def test_change_streams_support_is_detected_once(mocker):
+    mocker.patch.object(Settings, "CHANGE_FEED_POLL_INTERVAL", 0.01)
+    collection = mocker.MagicMock()
+    opened = collection.watch.return_value.__aenter__
+    opened.side_effect = [AutoReconnect("not master"), collection.watch.return_value]
+    assert await change_streams_supported(collection)
+    assert opened.call_count == 2
+
+    # standalone servers answer the stream's aggregation with code 40573
+    opened.side_effect = OperationFailure("only supported on replica sets", code=40573)
+    assert not await change_streams_supported(collection)
+
+
+@pytest.mark.asyncio
+async def test_change_feed_errors_are_not_taken_for_missing_change_streams(mocker):
+    mocker.patch("app.changes.change_streams_supported", return_value=True)
+    poll = mocker.patch("app.changes.poll_changes")
+    mocker.patch("app.changes.apply_change", side_effect=TypeError("bug"))
+    collection = mocker.MagicMock()
+    stream = collection.watch.return_value.__aenter__.return_value
+    stream.__aiter__.return_value = [{"operationType": "delete", "documentKey": {"_id": 1}}]
+
+    with pytest.raises(TypeError):
+        await watch_changes(collection, mocker.Mock(), CarFeed())
+    poll.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_polling_sees_writes_of_the_same_millisecond(mocker):
+    mocker.patch.object(Settings, "CHANGE_FEED_POLL_INTERVAL", 0.01)
+    collection = AsyncMongoMockClient()["tests"]["cars_polling"]
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10), ttl=10)
+    feed = CarFeed()
+    updated_at = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(microsecond=0)
+    cars = [{"_id": ObjectId(), "updated_at": updated_at, "version": 1} for _ in range(2)]
+
+    with feed.subscribe() as queue:
+        poller = asyncio.create_task(poll_changes(collection, cache, feed))
+        await collection.insert_one(cars[0])
+        await asyncio.wait_for(queue.get(), 1)
+        # a second car written in the millisecond the last poll ended on
+        await collection.insert_one(cars[1])
+        await asyncio.wait_for(queue.get(), 1)
+        await collection.update_one({"_id": cars[0]["_id"]}, {"$inc": {"version": 1}})
+        event, _ = await asyncio.wait_for(queue.get(), 1)
+        await asyncio.sleep(0.05)
+        poller.cancel()
+
+    # each write once, nothing applied twice
+    assert event == "update"
+    assert queue.empty()
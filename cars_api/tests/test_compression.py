@@ -0,0 +1,61 @@
+import gzip
+import json
+import zlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, GzipEncoder, negotiate
+from app.main import app
+
+
+def test_negotiate():
+    preferred = ["zstd", "br", "gzip"]
+    assert negotiate("gzip, deflate, br", preferred) == "br"
+    assert negotiate("gzip;q=0.5, br;q=0", preferred) == "gzip"
+    assert negotiate("*", preferred) == "zstd"
+    assert negotiate("identity", preferred) is None
+    assert negotiate("", preferred) is None
+
+
+def test_gzip_encoder_streams():
+    encoder = GzipEncoder()
+    chunks = [encoder.compress(b'{"a":1}\n') + encoder.flush()]
+    # every flushed chunk can be decoded on its own, as it arrives
+    assert zlib.decompressobj(31).decompress(chunks[0]) == b'{"a":1}\n'
+    chunks.append(encoder.compress(b'{"a":2}\n') + encoder.finish())
+    assert gzip.decompress(b"".join(chunks)) == b'{"a":1}\n{"a":2}\n'
+
+
+@pytest.mark.asyncio
+async def test_compressed_responses(test_client, mongodb_seeded):
+    response = test_client.get("/cars", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers  # under COMPRESSION_MIN_SIZE
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response = test_client.get("/cars/export", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 3
+
+    client = TestClient(CompressionMiddleware(app, minimum_size=10, encodings=["zstd", "gzip"]))
+    response = client.get("/cars", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["etag"].startswith('W/"')
+    assert len(response.json()) == 3
+
+    response = client.get("/cars", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_all_compact(test_client, mongodb_seeded, test_data):
+    response = test_client.get("/cars", params={"format": "compact", "view": "card"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["fields"] == ["brand", "make", "year", "price", "_id"]
+    assert body["rows"][0] == ["Citroen", "C3", 2004, 2050, test_data[2]["_id"]]
+
+    response = test_client.get("/cars", params={"format": "compact", "fields": "price,brand"})
+    assert response.json()["fields"] == ["brand", "price", "_id"]
+    assert json.dumps(response.json()).count("brand") == 1
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from app.cache import get_cache
+from app.conditional import etag_matches
+
+
+def test_etag_matches():
+    assert etag_matches('W/"abc-1"', 'W/"abc-1"')
+    assert etag_matches('"other", "abc-1"', 'W/"abc-1"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('W/"abc-1"', 'W/"abc-2"')
+    assert not etag_matches(None, '"abc"')
+
+
+@pytest.mark.asyncio
+async def test_car_details_conditional_get(test_client, mongodb_seeded, test_data):
+    new_car = {
+        k: v for k, v in test_data[0].items() if k in {"brand", "make", "year", "km", "price"}
+    }
+    new_car["cm3"] = 1248
+    car_id = test_client.post("/cars/", data=json.dumps(new_car)).json()["_id"]
+
+    response = test_client.get(f"/cars/{car_id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag == f'W/"{car_id}-1"'
+    assert "Last-Modified" in response.headers
+    assert response.headers["Cache-Control"].startswith("public")
+
+    # answered from the response cache
+    response = test_client.get(f"/cars/{car_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    # answered from a version-only lookup
+    await get_cache().clear()
+    response = test_client.get(f"/cars/{car_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    response = test_client.put("/cars/", data=json.dumps({**new_car, "_id": car_id, "price": 9000}))
+    assert response.status_code == 200
+    response = test_client.get(f"/cars/{car_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == f'W/"{car_id}-2"'
+    assert response.json()["price"] == 9000
+
+
+@pytest.mark.asyncio
+async def test_list_all_conditional_get(test_client, mongodb_seeded):
+    response = test_client.get("/cars", params={"brand": "Fiat"})
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+
+    response = test_client.get("/cars", params={"brand": "Fiat"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    await get_cache().clear()
+    response = test_client.get("/cars", params={"brand": "Fiat"}, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+    response = test_client.get(
+        "/cars", params={"brand": "Citroen"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 200
@@ -0,0 +1,54 @@
+import pytest
+
+from app.filters import FILTER_SPECS, CarFilters
+
+
+def test_filter_specs_follow_the_car_model():
+    assert {spec.field: spec.kind for spec in FILTER_SPECS} == {
+        "brand": "in",
+        "make": "in",
+        "year": "range",
+        "cm3": "range",
+        "km": "range",
+        "price": "range",
+    }
+
+
+def test_compiled_query():
+    assert CarFilters().query() == {}
+
+    filters = CarFilters.from_params(
+        {"brand": ["Fiat", "Citroen,Fiat"], "min_year": 2010, "max_price": 8000, "max_km": None}
+    )
+    assert filters.query() == {
+        "brand": {"$in": ["Citroen", "Fiat"]},
+        "year": {"$gte": 2010},
+        "price": {"$lte": 8000},
+    }
+    assert CarFilters.from_params({"brand": ["Fiat"]}).query() == {"brand": "Fiat"}
+
+
+def test_equivalent_filters_share_a_cache_key():
+    repeated = CarFilters.from_params({"brand": ["Fiat", "Citroen"], "min_km": 0})
+    joined = CarFilters.from_params({"brand": [" Citroen,Fiat,"], "min_km": 0})
+    assert repeated == joined
+    assert repeated.cache_params() == {"brand": "Citroen,Fiat", "min_km": 0, "max_km": None}
+
+
+@pytest.mark.asyncio
+async def test_list_all_range_filters(test_client, mongodb_seeded):
+    response = test_client.get("/cars", params={"min_year": 2010, "max_km": 100000})
+    assert response.status_code == 200
+    assert [car["price"] for car in response.json()] == [5990]
+
+    response = test_client.get("/cars", params={"brand": "Citroen,Fiat", "min_price": 5990})
+    assert [car["price"] for car in response.json()] == [5990, 7300]
+
+    response = test_client.get("/cars", params=[("brand", "Citroen"), ("brand", "Fiat")])
+    assert len(response.json()) == 3
+
+    response = test_client.get("/cars", params={"min_cm3": -1})
+    assert response.status_code == 422
+
+    response = test_client.get("/cars/facets", params={"max_year": 2010})
+    assert response.json()["total"] == 1
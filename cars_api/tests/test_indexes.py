@@ -0,0 +1,88 @@
+import os
+
+import pytest
+from bson import ObjectId
+from mongomock_motor import AsyncMongoMockClient
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.filters import CarFilters
+from app.indexes import CAR_INDEXES, ensure_indexes, missing_indexes
+from app.routers.cars import LIST_SORT, build_list_query
+from benchmarks.data import synthetic_cars
+
+MONGODB_TEST_URL = os.environ.get("MONGODB_TEST_URL")
+PAGE_LIMIT = 25
+
+
+def plan_stages(plan: dict) -> list[dict]:
+    stages = [plan] if "stage" in plan else []
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+
+@pytest.mark.asyncio
+async def test_ensure_indexes():
+    collection = AsyncMongoMockClient()["tests"]["cars"]
+    assert await missing_indexes(collection) == [index.document["name"] for index in CAR_INDEXES]
+
+    await ensure_indexes(collection)
+    assert await missing_indexes(collection) == []
+
+    # idempotent
+    await ensure_indexes(collection)
+    assert await missing_indexes(collection) == []
+
+
+@pytest.mark.skipif(not MONGODB_TEST_URL, reason="needs a real MongoDB server (MONGODB_TEST_URL)")
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "query, index_name, price_bounds",
+    [
+        (build_list_query(CarFilters()), "price_id", ["[MinKey, MaxKey]"]),
+        (
+            build_list_query(CarFilters.from_params({"max_price": 10000})),
+            "price_id",
+            ["[-inf.0, 10000]"],
+        ),
+        (
+            build_list_query(CarFilters.from_params({"brand": ["Fiat"], "min_price": 1000})),
+            "brand_price_id",
+            ["[1000, inf.0]"],
+        ),
+        (build_list_query(CarFilters(), last_seen=(5000, ObjectId())), "price_id", None),
+        (
+            build_list_query(
+                CarFilters.from_params({"brand": ["Fiat"], "max_price": 10000}),
+                last_seen=(5000, ObjectId()),
+            ),
+            "brand_price_id",
+            None,
+        ),
+    ],
+)
+async def test_list_queries_use_their_index(query, index_name, price_bounds):
+    client = AsyncIOMotorClient(MONGODB_TEST_URL)
+    collection = client["cars_api_tests"]["cars_indexes"]
+    try:
+        await collection.insert_many(synthetic_cars(2000))
+        await ensure_indexes(collection)
+        explain = await collection.find(query).sort(LIST_SORT).limit(PAGE_LIMIT).explain()
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        scans = [stage for stage in stages if stage["stage"] == "IXSCAN"]
+        assert scans
+        assert {scan["indexName"] for scan in scans} == {index_name}
+        if price_bounds is not None:
+            assert [scan["indexBounds"]["price"] for scan in scans] == [price_bounds] * len(scans)
+        # the index order is the listing order, nothing is sorted in memory
+        assert not [stage for stage in stages if stage["stage"] == "SORT"]
+
+        # every key read is a listed car, bar the one telling the page is full
+        stats = explain["executionStats"]
+        assert stats["totalKeysExamined"] <= stats["nReturned"] + len(scans)
+    finally:
+        await collection.drop()
+        client.close()
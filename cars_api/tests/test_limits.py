@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from fastapi.routing import APIRoute
+
+import app.routing
+from app.config import Settings, rate_limits
+from app.limits import AdmissionMiddleware, InMemoryRateLimitBackend
+
+
+def test_rate_limits_setting():
+    assert rate_limits("*=50:100, list_all=0.5:3,get_one_car=2") == {
+        "*": (50.0, 100),
+        "list_all": (0.5, 3),
+        "get_one_car": (2.0, 2),
+    }
+    with pytest.raises(ValueError):
+        rate_limits("list_all=0:10")
+
+
+@pytest.mark.asyncio
+async def test_token_bucket(mocker):
+    monotonic = mocker.patch("app.limits.time.monotonic", return_value=100.0)
+    backend = InMemoryRateLimitBackend(max_keys=2)
+
+    assert [await backend.take("a", rate=2, burst=3) for _ in range(4)] == [0, 0, 0, 0.5]
+    monotonic.return_value = 100.5
+    assert await backend.take("a", rate=2, burst=3) == 0
+    assert await backend.take("a", rate=2, burst=3) == 0.5
+
+    # least recently used keys are dropped, they start again with a full bucket
+    await backend.take("b", rate=2, burst=3)
+    await backend.take("c", rate=2, burst=3)
+    assert await backend.take("a", rate=2, burst=3) == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_route(test_client, mongodb_seeded, mocker):
+    mocker.patch.object(Settings, "RATE_LIMITS", {"*": (100, 100), "list_all": (0.5, 2)})
+
+    assert test_client.get("/cars").status_code == 200
+    assert test_client.get("/cars").status_code == 200
+    response = test_client.get("/cars")
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.json() == "Too many requests, please retry later"
+    # browsers can read the rejection, CORS is the outermost middleware
+    response = test_client.get("/cars", headers={"Origin": "https://cars.example"})
+    assert response.status_code == 429
+    assert response.headers["Access-Control-Allow-Origin"] == "*"
+
+    # other routes and clients keep their own buckets
+    assert test_client.get("/cars/facets").status_code == 200
+    assert test_client.get("/metrics").status_code == 200
+    mocker.patch.object(Settings, "RATE_LIMIT_KEY_HEADER", "X-API-Key")
+    assert test_client.get("/cars", headers={"X-API-Key": "partner"}).status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_in_flight_cap(mocker):
+    mocker.patch.object(Settings, "MAX_DB_REQUESTS_IN_FLIGHT", 1)
+    mocker.patch.object(Settings, "RATE_LIMITS", {})
+    release = asyncio.Event()
+    sent = []
+
+    async def slow_app(scope, receive, send):
+        await release.wait()
+
+    async def send(message):
+        sent.append(message)
+
+    middleware = AdmissionMiddleware(slow_app, route_prefix="/cars")
+    mocker.patch.object(middleware, "route_name", return_value="list_all")
+    scope = {"type": "http", "headers": []}
+
+    first = asyncio.create_task(middleware(scope, None, send))
+    await asyncio.sleep(0)
+    await middleware(scope, None, send)
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+
+    release.set()
+    await first
+    assert middleware.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_route_matched_once_per_request(test_client, mongodb_seeded, mocker):
+    match_route = mocker.spy(app.routing, "match_route")
+    matches = mocker.spy(APIRoute, "matches")
+
+    assert test_client.get("/cars/facets").status_code == 200
+    assert match_route.call_count == 1
+    # once ahead of the middlewares, once more by the router itself
+    facets_matches = [call for call in matches.call_args_list if call.args[0].name == "list_facets"]
+    assert len(facets_matches) == 2
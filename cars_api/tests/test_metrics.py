@@ -0,0 +1,96 @@
+import logging
+
+import pytest
+from dotmap import DotMap
+from pymongo.errors import OperationFailure
+
+from app.metrics import (
+    HTTP_REQUEST_DURATION,
+    MONGODB_COMMAND_DURATION,
+    MONGODB_DOCUMENTS_RETURNED,
+    Histogram,
+    MongoCommandMetrics,
+    server_query_metrics,
+)
+
+
+def test_histogram_render():
+    histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1))
+    histogram.observe(0.05, route="/cars/")
+    histogram.observe(0.5, route="/cars/")
+
+    lines = histogram.render()
+    assert "# TYPE test_seconds histogram" in lines
+    assert 'test_seconds_bucket{route="/cars/",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/cars/",le="1"} 2' in lines
+    assert 'test_seconds_bucket{route="/cars/",le="+Inf"} 2' in lines
+    assert 'test_seconds_count{route="/cars/"} 2' in lines
+
+
+def test_request_metrics(test_client, mongodb_seeded, test_data):
+    labels = {"method": "GET", "route": "/cars/{car_id}", "status": 200}
+    requests_before = HTTP_REQUEST_DURATION.count(**labels)
+
+    assert test_client.get(f"/cars/{test_data[0]['_id']}").status_code == 200
+    assert HTTP_REQUEST_DURATION.count(**labels) == requests_before + 1
+
+    # labelled by the matched route's template, whatever the path parameter values
+    not_found = {**labels, "status": 404}
+    not_found_before = HTTP_REQUEST_DURATION.count(**not_found)
+    assert test_client.get("/cars/65d804debfef2fc45309aeb9").status_code == 404
+    assert HTTP_REQUEST_DURATION.count(**not_found) == not_found_before + 1
+    unmatched = {"method": "GET", "route": "unmatched", "status": 404}
+    unmatched_before = HTTP_REQUEST_DURATION.count(**unmatched)
+    assert test_client.get("/trucks/1").status_code == 404
+    assert HTTP_REQUEST_DURATION.count(**unmatched) == unmatched_before + 1
+
+    response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert (
+        'http_request_duration_seconds_count{method="GET",route="/cars/{car_id}"' in response.text
+    )
+    assert "http_requests_in_flight" in response.text
+    assert "response_cache_hits_total" in response.text
+
+
+def test_mongodb_command_metrics(caplog, mocker):
+    mocker.patch("app.metrics.Settings.SLOW_QUERY_MS", 50)
+    listener = MongoCommandMetrics()
+    find_count = MONGODB_COMMAND_DURATION.count(command="find")
+    returned = MONGODB_DOCUMENTS_RETURNED.value(command="find")
+
+    listener.started(DotMap(request_id=1, command={"find": "cars", "filter": {"brand": "Fiat"}}))
+    reply = {"cursor": {"firstBatch": [{}, {}, {}]}}
+    event = DotMap(
+        request_id=1, command_name="find", database_name="cars_db", duration_micros=80000
+    )
+    event.reply = reply
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        listener.succeeded(event)
+
+    assert MONGODB_COMMAND_DURATION.count(command="find") == find_count + 1
+    assert MONGODB_DOCUMENTS_RETURNED.value(command="find") == returned + 3
+    assert "Slow MongoDB find on cars_db took 80.0ms" in caplog.text
+    assert '"brand": "Fiat"' in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_server_query_metrics(mocker):
+    database = mocker.Mock()
+    database.command = mocker.AsyncMock(
+        return_value={
+            "metrics": {
+                "queryExecutor": {"scannedObjects": 5000, "scanned": 8000},
+                "document": {"returned": 250},
+            }
+        }
+    )
+    lines = await server_query_metrics(database)
+    database.command.assert_awaited_once_with("serverStatus")
+    assert "mongodb_server_documents_examined_total 5000" in lines
+    assert "mongodb_server_keys_examined_total 8000" in lines
+    assert "mongodb_server_documents_returned_total 250" in lines
+
+    # users without the clusterMonitor role still get the other metrics
+    database.command.side_effect = OperationFailure("not authorized", code=13)
+    assert await server_query_metrics(database) == []
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from app.cache import get_cache
+from app.config import Settings
+from app.search import backfill_search_fields, edge_ngrams, normalize, search_terms
+
+
+def test_search_terms():
+    assert normalize("Mercedes-Benz  Classe É") == ["mercedes", "benz", "classe", "e"]
+    assert search_terms("Volkswagen", "Golf") == ["volkswagen", "golf", "vw"]
+    assert search_terms("Citroen", 3) == ["citroen", "3"]
+    assert edge_ngrams(["golf", "gol"]) == ["g", "go", "gol", "golf"]
+
+
+@pytest.mark.asyncio
+async def test_list_all_search(test_client, mongodb_seeded):
+    new_cars = [
+        {"brand": "Volkswagen", "make": "Golf", "price": 9000},
+        {"brand": "Volkswagen", "make": "Golf Plus", "price": 8000},
+        {"brand": "Volkswagen", "make": "Golfino", "price": 3000},
+        {"brand": "Mercedes-Benz", "make": "C 220", "price": 9500},
+    ]
+    new_cars = [{**car, "year": 2012, "cm3": 1600, "km": 90000} for car in new_cars]
+    response = test_client.post("/cars/bulk", data=json.dumps(new_cars))
+    assert response.json()["inserted"] == 4
+
+    response = test_client.get("/cars", params={"q": "vw golf"})
+    assert response.status_code == 200
+    # exact "golf" matches rank first, then the prefix-only match
+    assert [car["make"] for car in response.json()] == ["Golf Plus", "Golf", "Golfino"]
+    assert "search_prefixes" not in response.json()[0]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = test_client.get("/cars", params={"q": "merc", "view": "card"})
+    assert [car["make"] for car in response.json()] == ["C 220"]
+
+    response = test_client.get("/cars", params={"q": "golf", "page": 2, "page_limit": 2})
+    assert [car["make"] for car in response.json()] == ["Golfino"]
+    # the total counts the cars matching the search, not every car
+    response = test_client.get(
+        "/cars", params={"q": "golf", "page": 2, "page_limit": 2, "include_total": True}
+    )
+    assert [car["make"] for car in response.json()] == ["Golfino"]
+    assert response.headers["X-Total-Count"] == "3"
+
+    response = test_client.get("/cars", params={"q": "golf", "cursor": "abc"})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_backfill_search_fields(test_client, mongodb_seeded):
+    assert test_client.get("/cars", params={"q": "fia"}).json() == []
+
+    assert await backfill_search_fields(mongodb_seeded[Settings.COLLECTION_NAME], batch_size=2) == 3
+    await get_cache().clear()
+
+    response = test_client.get("/cars", params={"q": "fia"})
+    assert [car["brand"] for car in response.json()] == ["Fiat", "Fiat"]
@@ -0,0 +1,26 @@
+import json
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from app.models import CarModelCard, CarModelFull, model_projection
+from app.serialization import compile_row_converter, dumps
+
+
+def test_row_converter_matches_model_output(test_data):
+    for model in (CarModelFull, CarModelCard):
+        convert = compile_row_converter(model)
+        for car in test_data:
+            document = {key: car[key] for key in model_projection(model)}
+            document["_id"] = ObjectId(car["_id"])
+            document["make"] = 500  # 'make' stored as a number
+
+            assert convert(document) == jsonable_encoder(model(**document))
+
+
+def test_dumps_objectid():
+    objectid = ObjectId()
+    assert json.loads(dumps({"_id": objectid, "price": 1000})) == {
+        "_id": str(objectid),
+        "price": 1000,
+    }
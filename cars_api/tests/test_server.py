@@ -0,0 +1,34 @@
+from app import server
+from app.config import Settings
+from app.database import pool_size
+
+
+def test_pool_size_from_connection_budget(mocker):
+    mocker.patch.object(Settings, "DB_CONNECTION_BUDGET", 0)
+    assert pool_size() == Settings.DB_MAX_POOL_SIZE
+
+    mocker.patch.object(Settings, "DB_CONNECTION_BUDGET", 200)
+    mocker.patch.object(Settings, "SERVER_WORKERS", 8)
+    assert pool_size() == 25
+
+    mocker.patch.object(Settings, "SERVER_WORKERS", 400)
+    assert pool_size() == 1
+
+
+def test_run_production_server(mocker, monkeypatch):
+    monkeypatch.setenv("SERVER_WORKERS", "0")
+    mocker.patch.object(Settings, "SERVER_WORKERS", 4)
+    mocker.patch("importlib.util.find_spec", return_value=None)
+    run = mocker.patch("app.server.uvicorn.run")
+
+    server.run()
+    options = run.call_args.kwargs
+    assert run.call_args.args == ("app.main:app",)
+    assert options["workers"] == 4
+    assert (options["loop"], options["http"]) == ("asyncio", "h11")
+    assert options["timeout_graceful_shutdown"] == Settings.SERVER_GRACEFUL_TIMEOUT
+    assert "reload" not in options
+    # uvicorn 0.27 does not respawn workers, recycled workers would never come back
+    assert "limit_max_requests" not in options
+    # the worker processes size their pool from the same worker count
+    assert server.os.environ["SERVER_WORKERS"] == "4"
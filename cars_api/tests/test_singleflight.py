@@ -0,0 +1,187 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.cache import InMemoryCacheBackend, NullCacheBackend, ResponseCache, response_cache
+from app.config import Settings
+from app.main import app
+from app.singleflight import SINGLE_FLIGHT_CALLS, SINGLE_FLIGHT_COLLAPSED, SingleFlight
+
+BURST = 20
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_call():
+    flights = SingleFlight()
+    calls = []
+    release = asyncio.Event()
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return {"price": 7300}
+
+    before = SINGLE_FLIGHT_COLLAPSED.value(route="tests")
+    waiters = [asyncio.create_task(flights.do("car:1", call, route="tests")) for _ in range(BURST)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert SINGLE_FLIGHT_COLLAPSED.value(route="tests") == before + BURST - 1
+    # done calls are not reused
+    await flights.do("car:1", call, route="tests")
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_errors_cancellations_and_forgotten_calls():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def failing_call():
+        await release.wait()
+        raise ValueError("query failed")
+
+    waiters = [asyncio.create_task(flights.do("list:", failing_call, route="tests")) for _ in "ab"]
+    await asyncio.sleep(0)
+    # one caller leaving does not cancel the call the other waits on
+    waiters[0].cancel()
+    release.set()
+    with pytest.raises(ValueError):
+        await waiters[1]
+
+    release.clear()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await release.wait()
+        return len(calls)
+
+    stored = []
+
+    async def store(result):
+        stored.append(result)
+
+    before = asyncio.create_task(flights.do("list:page=1", call, route="tests", store=store))
+    await asyncio.sleep(0)
+    flights.forget(prefix="list:")
+    after = asyncio.create_task(flights.do("list:page=1", call, route="tests", store=store))
+    await asyncio.sleep(0)
+    release.set()
+    assert (await before, await after) == (2, 2)
+    assert len(calls) == 2
+    # only the call started after the forget stores its result
+    assert stored == [2]
+
+
+@pytest.fixture
+def uncached(test_client):
+    """Every request of a burst misses the response cache"""
+    cache = ResponseCache(NullCacheBackend(), Settings.CACHE_TTL)
+
+    async def null_cache():
+        return cache
+
+    app.dependency_overrides[response_cache] = null_cache
+    yield
+    del app.dependency_overrides[response_cache]
+
+
+async def burst(path: str) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await asyncio.gather(*(client.get(path) for _ in range(BURST)))
+
+
+@pytest.mark.asyncio
+async def test_car_details_burst_runs_one_query(mongodb_seeded, uncached, test_data, mocker):
+    collection_type = type(mongodb_seeded[Settings.COLLECTION_NAME])
+    find_one = collection_type.find_one
+    queries = []
+
+    async def slow_find_one(collection, *args, **kwargs):
+        queries.append(args)
+        await asyncio.sleep(0.05)
+        return await find_one(collection, *args, **kwargs)
+
+    mocker.patch.object(collection_type, "find_one", slow_find_one)
+    calls = SINGLE_FLIGHT_CALLS.value(route="get_one_car")
+
+    responses = await burst(f"/cars/{test_data[0]['_id']}")
+    assert [response.status_code for response in responses] == [200] * BURST
+    assert len({response.content for response in responses}) == 1
+    assert responses[0].json()["price"] == test_data[0]["price"]
+    assert len(queries) == 1
+    assert SINGLE_FLIGHT_CALLS.value(route="get_one_car") == calls + 1
+
+
+@pytest.mark.asyncio
+async def test_listing_burst_runs_one_query(mongodb_seeded, uncached, mocker):
+    collection_type = type(mongodb_seeded[Settings.COLLECTION_NAME])
+    find = mocker.spy(collection_type, "find")
+    count_documents = collection_type.count_documents
+    counts = []
+
+    async def slow_count_documents(collection, *args, **kwargs):
+        counts.append(args)
+        await asyncio.sleep(0.05)
+        return await count_documents(collection, *args, **kwargs)
+
+    mocker.patch.object(collection_type, "count_documents", slow_count_documents)
+
+    responses = await burst("/cars/?page=1&include_total=true")
+    assert [response.status_code for response in responses] == [200] * BURST
+    assert {response.headers["X-Total-Count"] for response in responses} == {"3"}
+    assert len({response.headers["ETag"] for response in responses}) == 1
+    # one indexed page query and one count, run side by side
+    assert find.call_count == 1
+    assert len(counts) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_during_listing_query_is_not_cached_over(mongodb_seeded, mocker):
+    cache = ResponseCache(InMemoryCacheBackend(max_entries=10), Settings.CACHE_TTL)
+
+    async def shared_cache():
+        return cache
+
+    app.dependency_overrides[response_cache] = shared_cache
+    collection_type = type(mongodb_seeded[Settings.COLLECTION_NAME])
+    find = collection_type.find
+    query_started, write_done = asyncio.Event(), asyncio.Event()
+
+    class SlowCursor:
+        def __init__(self, cursor):
+            self.cursor = cursor
+
+        def __getattr__(self, name):
+            method = getattr(self.cursor, name)
+            return lambda *args, **kwargs: SlowCursor(method(*args, **kwargs))
+
+        async def __aiter__(self):
+            query_started.set()
+            await write_done.wait()
+            async for car in self.cursor:
+                yield car
+
+    mocker.patch.object(
+        collection_type, "find", lambda *args, **kwargs: SlowCursor(find(*args, **kwargs))
+    )
+    cache_set = mocker.spy(cache, "set")
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            listing = asyncio.create_task(client.get("/cars/"))
+            await asyncio.wait_for(query_started.wait(), 1)
+            await cache.invalidate_cars()
+            write_done.set()
+            assert (await listing).status_code == 200
+    finally:
+        del app.dependency_overrides[response_cache]
+
+    # the page read before the write answered its request but was not cached
+    cache_set.assert_not_called()
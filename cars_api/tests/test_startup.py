@@ -0,0 +1,150 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import ServerSelectionTimeoutError
+
+from app import main
+from app.config import Settings
+
+# Share of the import of app.main spent in the app's own modules, loose enough for slow CI
+# runners: it catches work moved back to import time, not small regressions
+APP_MODULES_BUDGET_SECONDS = 2.0
+# Optional or launcher-only packages, imported by the code paths that use them
+LAZY_MODULES = ("uvicorn", "numpy", "redis", "brotli", "zstandard")
+
+IMPORT_APP = """
+import json, sys
+import app.main
+print(json.dumps({"loaded": [name for name in sys.argv[1:] if name in sys.modules]}))
+"""
+
+
+def test_import_time_budget():
+    # Settings are read on first use, importing the app does not need them
+    env = {
+        name: value
+        for name, value in os.environ.items()
+        if name not in ("DB_URL", "DB_NAME", "COLLECTION_NAME")
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_APP, *LAZY_MODULES],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=os.path.dirname(os.path.dirname(__file__)),
+    )
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout)["loaded"] == []
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    app_modules_us = sum(
+        int(line.split("|")[0].split(":")[1])
+        for line in result.stderr.splitlines()
+        if line.split("|")[-1].strip().split(".")[0] == "app"
+    )
+    assert app_modules_us / 1e6 < APP_MODULES_BUDGET_SECONDS
+
+
+@pytest.fixture
+def lifespan_client(mocker):
+    mocker.patch.object(Settings, "DB_ENSURE_INDEXES", False)
+    mocker.patch.object(Settings, "CHANGE_FEED_ENABLED", False)
+    mocker.patch.object(Settings, "WARM_UP_RETRY_INTERVAL", 0.01)
+    client = AsyncMongoMockClient()
+    mocker.patch("app.main.connect_to_mongodb", return_value=client)
+    mocker.patch("app.main.close_mongodb_connection")
+    yield client
+    main.app.state.ready = False
+
+
+def test_ready_once_warmed_up(lifespan_client, mocker):
+    openapi = mocker.spy(main.app, "openapi")
+    with TestClient(main.app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready"}
+    openapi.assert_called_once()
+
+
+def test_not_ready_until_database_answers(lifespan_client, mocker):
+    database_up = False
+
+    async def ping(command):
+        if not database_up:
+            raise ServerSelectionTimeoutError("No servers found")
+        return {"ok": 1}
+
+    database_client = mocker.MagicMock()
+    database_client.admin.command = mocker.AsyncMock(side_effect=ping)
+    mocker.patch("app.main.connect_to_mongodb", return_value=database_client)
+
+    with TestClient(main.app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json() == "Warming up"
+
+        database_up = True
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.01)
+        assert client.get("/ready").status_code == 200
+
+
+def test_indexes_ensured_once_database_answers(lifespan_client, mocker):
+    mocker.patch.object(Settings, "DB_ENSURE_INDEXES", True)
+    ensure_indexes = mocker.patch("app.warmup.ensure_indexes")
+    database_up = False
+
+    async def ping(command):
+        if not database_up:
+            raise ServerSelectionTimeoutError("No servers found")
+        return {"ok": 1}
+
+    database_client = mocker.MagicMock()
+    database_client.admin.command = mocker.AsyncMock(side_effect=ping)
+    mocker.patch("app.main.connect_to_mongodb", return_value=database_client)
+
+    with TestClient(main.app) as client:
+        assert client.get("/ready").status_code == 503
+        ensure_indexes.assert_not_called()
+
+        database_up = True
+        for _ in range(100):
+            if client.get("/ready").status_code == 200:
+                break
+            time.sleep(0.01)
+        assert client.get("/ready").status_code == 200
+    ensure_indexes.assert_called_once_with(
+        database_client[Settings.DB_NAME][Settings.COLLECTION_NAME]
+    )
+
+
+def test_background_tasks_awaited_on_shutdown(lifespan_client, mocker):
+    events = []
+
+    async def retry_forever():
+        try:
+            await asyncio.sleep(3600)
+        finally:
+            await asyncio.sleep(0)
+            events.append("warm-up stopped")
+
+    async def warm_up(*args, **kwargs):
+        return asyncio.create_task(retry_forever())
+
+    mocker.patch("app.main.warm_up", warm_up)
+    mocker.patch(
+        "app.main.close_mongodb_connection", side_effect=lambda: events.append("client closed")
+    )
+    with TestClient(main.app):
+        pass
+    # the task is done with the client before it is closed
+    assert events == ["warm-up stopped", "client closed"]
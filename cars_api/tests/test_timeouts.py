@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from pymongo import ReadPreference, _csot
+from pymongo.errors import ExecutionTimeout, OperationFailure
+from starlette.requests import Request
+
+from app.config import Settings, read_preferences, request_timeouts
+from app.database import mongodb_client, route_read_preference
+from app.metrics import REGISTRY
+from app.timeouts import HTTP_REQUESTS_TIMED_OUT, TimeoutMiddleware, outside_time_budget
+
+
+def route_request(name: str) -> Request:
+    route = type("Route", (), {"name": name})()
+    return Request({"type": "http", "headers": [], "route": route})
+
+
+def test_route_options():
+    assert read_preferences("list_all=secondaryPreferred, export_cars=nearest") == {
+        "list_all": "secondaryPreferred",
+        "export_cars": "nearest",
+    }
+    with pytest.raises(ValueError):
+        read_preferences("list_all=secondaryPrefered")
+    assert request_timeouts("*=5,export_cars=0") == {"*": 5.0, "export_cars": 0.0}
+
+
+@pytest.mark.asyncio
+async def test_read_preference_per_route(mocker):
+    mocker.patch.object(Settings, "READ_PREFERENCES", {"list_all": "secondaryPreferred"})
+    assert route_read_preference(route_request("list_all")) == ReadPreference.SECONDARY_PREFERRED
+    assert route_read_preference(route_request("add_new_car")) == ReadPreference.PRIMARY
+
+    client = mocker.patch("app.database.connect_to_mongodb").return_value
+    async for database in mongodb_client(route_request("list_all")):
+        assert database is client.get_database.return_value
+    client.get_database.assert_called_once_with(
+        Settings.DB_NAME, read_preference=ReadPreference.SECONDARY_PREFERRED
+    )
+
+
+async def call(middleware: TimeoutMiddleware) -> list[dict]:
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware({"type": "http", "headers": []}, None, send)
+    return sent
+
+
+@pytest.fixture
+def budget(mocker):
+    mocker.patch("app.timeouts.route_name", return_value="get_one_car")
+    mocker.patch.object(Settings, "REQUEST_TIMEOUTS", {"*": 0.05, "export_cars": 0})
+
+
+@pytest.mark.asyncio
+async def test_spent_budget_answers_503(budget):
+    deadlines = []
+
+    async def slow_app(scope, receive, send):
+        deadlines.append(_csot.get_timeout())
+        await asyncio.sleep(1)
+
+    before = HTTP_REQUESTS_TIMED_OUT.value(route="get_one_car")
+    sent = await call(TimeoutMiddleware(slow_app, route_prefix="/cars"))
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", str(Settings.TIMEOUT_RETRY_AFTER).encode()) in sent[0]["headers"]
+    assert sent[1]["body"] == b'"Database timeout, please retry later"'
+    # MongoDB operations of the request share its budget
+    assert deadlines == [0.05]
+    assert HTTP_REQUESTS_TIMED_OUT.value(route="get_one_car") == before + 1
+    assert "http_requests_timed_out_total" in REGISTRY.render()
+
+
+@pytest.mark.asyncio
+async def test_mongodb_timeouts_answer_503(budget, mocker):
+    mocker.patch.object(Settings, "REQUEST_TIMEOUTS", {"*": 0})
+
+    async def timed_out_app(scope, receive, send):
+        raise ExecutionTimeout("operation exceeded time limit", 50)
+
+    sent = await call(TimeoutMiddleware(timed_out_app, route_prefix="/cars"))
+    assert sent[0]["status"] == 503
+
+
+@pytest.mark.asyncio
+async def test_other_errors_and_started_responses_are_raised(budget):
+    async def failing_app(scope, receive, send):
+        raise OperationFailure("unauthorized", 13)
+
+    with pytest.raises(OperationFailure):
+        await call(TimeoutMiddleware(failing_app, route_prefix="/cars"))
+
+    async def streaming_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        await call(TimeoutMiddleware(streaming_app, route_prefix="/cars"))
+
+
+@pytest.mark.asyncio
+async def test_background_tasks_run_out_of_the_budget(budget):
+    background = []
+
+    @outside_time_budget
+    async def refresh():
+        await asyncio.sleep(0.1)
+        background.append(_csot.get_timeout())
+
+    async def app_with_background_task(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+        await refresh()
+
+    sent = await call(TimeoutMiddleware(app_with_background_task, route_prefix="/cars"))
+    assert [message.get("status") for message in sent] == [200, None]
+    # past the 0.05s budget, without a MongoDB deadline
+    assert background == [None]
+
+
+@pytest.mark.asyncio
+async def test_slow_car_details_query(test_client, mongodb_seeded, test_data, mocker):
+    mocker.patch.object(Settings, "REQUEST_TIMEOUTS", {"*": 0.05})
+
+    async def slow_find_one(*args, **kwargs):
+        await asyncio.sleep(1)
+
+    collection = mongodb_seeded[Settings.COLLECTION_NAME]
+    mocker.patch.object(type(collection), "find_one", slow_find_one)
+
+    response = test_client.get(f"/cars/{test_data[0]['_id']}")
+    assert response.status_code == 503
+    assert response.json() == "Database timeout, please retry later"
@@ -0,0 +1,164 @@
+import json
+from datetime import datetime
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from app.config import Settings
+from app.valuation import rebuild_price_stats, rebuild_price_stats_numpy, refresh_buckets, summarize
+from benchmarks.data import synthetic_cars
+
+
+def test_summarize():
+    assert summarize([1000, 2000, 3000, 4000]) == {
+        "count": 4,
+        "mean": 2500,
+        "p10": 1300,
+        "p25": 1750,
+        "p50": 2500,
+        "p75": 3250,
+        "p90": 3700,
+    }
+    assert summarize([5000])["p90"] == 5000
+
+
+@pytest.mark.asyncio
+async def test_rebuild_and_refresh_price_stats(mocker):
+    database = AsyncMongoMockClient()["tests"]
+    cars, stats = database["cars_valuation"], database["stats_valuation"]
+    await cars.insert_many(
+        [
+            {"brand": "Fiat", "make": "Doblo", "year": year, "km": km, "price": price}
+            for year, km, price in [
+                (2015, 115000, 7300),
+                (2016, 110000, 5990),
+                (2019, 140000, 9000),
+                (2020, 100000, 12000),
+            ]
+        ]
+    )
+    await stats.insert_one({"_id": "gone", "refreshed_at": datetime(2020, 1, 1)})
+
+    assert await rebuild_price_stats(cars, stats) == 2
+    bucket = await stats.find_one({"_id": "fiat|doblo|2015|100000"})
+    assert (bucket["count"], bucket["p50"]) == (3, 7300)
+    assert await stats.find_one({"_id": "gone"}) is None
+
+    new_car = {"brand": "Fiat", "make": "Doblo", "year": 2017, "km": 120000, "price": 8000}
+    await cars.insert_one(dict(new_car))
+    await refresh_buckets(cars, stats, [new_car])
+    bucket = await stats.find_one({"_id": "fiat|doblo|2015|100000"})
+    assert (bucket["count"], bucket["p50"]) == (4, 7650)
+
+    # buckets too big to refresh per write wait for the next rebuild
+    mocker.patch.object(Settings, "VALUATION_REFRESH_MAX_CARS", 4)
+    await cars.insert_one({**new_car, "price": 20000})
+    await refresh_buckets(cars, stats, [new_car])
+    assert (await stats.find_one({"_id": "fiat|doblo|2015|100000"}))["count"] == 4
+
+    # a car leaving the last bucket of its kind empties the bucket
+    mocker.patch.object(Settings, "VALUATION_REFRESH_MAX_CARS", 10000)
+    await cars.delete_many({"year": {"$lt": 2020}})
+    await refresh_buckets(cars, stats, [new_car, new_car])
+    assert (await stats.find_one({"_id": "fiat|doblo|2015|100000"}))["count"] == 0
+
+    # a refresh that read the prices before a later one saved its statistics leaves them be
+    await stats.update_one(
+        {"_id": "fiat|doblo|2020|100000"}, {"$set": {"refreshed_at": datetime(2100, 1, 1)}}
+    )
+    await cars.insert_one({**new_car, "year": 2021})
+    await refresh_buckets(cars, stats, [{**new_car, "year": 2021}])
+    assert (await stats.find_one({"_id": "fiat|doblo|2020|100000"}))["count"] == 1
+
+    # makes stored as numbers share the bucket of their text spelling
+    await cars.insert_one({"brand": "Fiat", "make": 500, "year": 2021, "km": 0, "price": 9000})
+    await refresh_buckets(cars, stats, [{"brand": "Fiat", "make": "500", "year": 2021, "km": 0}])
+    assert (await stats.find_one({"_id": "fiat|500|2020|0"}))["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_numpy_rebuild_matches_aggregation():
+    pytest.importorskip("numpy")
+    database = AsyncMongoMockClient()["tests"]
+    cars = database["cars_valuation_numpy"]
+    await cars.insert_many(synthetic_cars(500))
+
+    await rebuild_price_stats(cars, database["stats_aggregation"])
+    await rebuild_price_stats_numpy(cars, database["stats_numpy"])
+    projection = {"refreshed_at": 0}
+    aggregation = await database["stats_aggregation"].find({}, projection).sort("_id").to_list(None)
+    vectorized = await database["stats_numpy"].find({}, projection).sort("_id").to_list(None)
+    assert aggregation == vectorized
+
+
+@pytest.mark.asyncio
+async def test_car_valuation(test_client, mongodb_seeded):
+    response = test_client.post(
+        "/cars/",
+        json={
+            "brand": "Fiat",
+            "make": "Doblo",
+            "year": 2016,
+            "cm3": 1248,
+            "km": 100000,
+            "price": 6500,
+        },
+    )
+    assert response.status_code == 201
+
+    response = test_client.get(
+        "/cars/valuation", params={"brand": "Fiat", "make": "Doblo", "year": 2017, "km": 120000}
+    )
+    assert response.status_code == 200
+    assert response.json() == {
+        "brand": "Fiat",
+        "make": "Doblo",
+        "year": {"min": 2015, "max": 2019},
+        "km": {"min": 100000, "max": 149999},
+        "count": 2,
+        "mean": 6900,
+        "percentiles": {"p10": 6580, "p25": 6700, "p50": 6900, "p75": 7100, "p90": 7220},
+    }
+    assert await mongodb_seeded[Settings.VALUATION_COLLECTION].count_documents({}) == 1
+
+    # brand and make are looked up whatever their case
+    response = test_client.get(
+        "/cars/valuation", params={"brand": "fiat", "make": "DOBLO", "year": 2017, "km": 120000}
+    )
+    assert response.status_code == 200
+    assert response.json()["count"] == 2
+
+    response = test_client.get(
+        "/cars/valuation", params={"brand": "Fiat", "make": "Punto", "year": 2017, "km": 0}
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_writes_refresh_the_buckets_cars_leave(test_client, mongodb_seeded):
+    stats = mongodb_seeded[Settings.VALUATION_COLLECTION]
+    response = test_client.post(
+        "/cars/",
+        json={
+            "brand": "Fiat",
+            "make": "Doblo",
+            "year": 2016,
+            "cm3": 1248,
+            "km": 100000,
+            "price": 6500,
+        },
+    )
+    car_id = response.json()["_id"]
+    assert (await stats.find_one({"_id": "fiat|doblo|2015|100000"}))["count"] == 2
+
+    test_client.patch(f"/cars/{car_id}", json={"year": 2021})
+    assert (await stats.find_one({"_id": "fiat|doblo|2015|100000"}))["count"] == 1
+    assert (await stats.find_one({"_id": "fiat|doblo|2020|100000"}))["count"] == 1
+
+    response = test_client.request("DELETE", "/cars/bulk", content=json.dumps([car_id]))
+    assert response.json()["deleted"] == 1
+    assert (await stats.find_one({"_id": "fiat|doblo|2020|100000"}))["count"] == 0
+    response = test_client.get(
+        "/cars/valuation", params={"brand": "Fiat", "make": "Doblo", "year": 2021, "km": 100000}
+    )
+    assert response.status_code == 404